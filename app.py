@@ -2,364 +2,3759 @@
 # This agent scrapes web and LinkedIn data to identify ideal partners for HubSpot's solution partner program
 
 import streamlit as st
-import requests
+import atexit
+import codecs
+import cProfile
+import functools
+import io
 import json
-import pandas as pd
+import logging
+import hashlib
+import heapq
+import importlib
 import time
-from bs4 import BeautifulSoup
+import random
 import re
-from linkedin_api import Linkedin
+import shutil
+import socket
+import subprocess
+import sys
 import os
+import pstats
+import sqlite3
+import tempfile
+import threading
+import tracemalloc
+import uuid
+import zlib
+from bisect import bisect_left, insort
+from collections import OrderedDict, deque
+from collections.abc import Mapping
+from contextlib import contextmanager, nullcontext
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlparse
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from dotenv import load_dotenv
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
 # Load environment variables
 load_dotenv()
 
-# Set page config
-st.set_page_config(
-    page_title="HubSpot Partner Finder",
-    page_icon="🔍",
-    layout="wide"
+# Stand-in for a heavy dependency that imports it on first attribute access.
+# The search page and most reruns never touch pandas, numpy, requests or the
+# LinkedIn client, so they no longer slow down a cold start.
+class LazyModule:
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+    
+    def __getattr__(self, attr):
+        module = self._module
+        if module is None:
+            # import_module holds the import lock, so threads racing here
+            # still get one module
+            module = self._module = importlib.import_module(self._name)
+        return getattr(module, attr)
+
+np = LazyModule("numpy")
+pd = LazyModule("pandas")
+requests = LazyModule("requests")
+urllib3 = LazyModule("urllib3")
+linkedin_api = LazyModule("linkedin_api")
+
+# Pipeline functions log instead of writing to the page, so they can run headless
+logger = logging.getLogger("partner_finder")
+
+# Default number of concurrent website/LinkedIn lookups in batch mode
+DEFAULT_MAX_WORKERS = int(os.getenv("PARTNER_FINDER_MAX_WORKERS", "16"))
+
+# Latency histogram bucket upper bounds, in seconds
+METRICS_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Rows shown per profile / allocation report
+PROFILE_REPORT_LINES = 25
+
+# Thread-safe counters and latency histograms for each pipeline stage
+class PipelineMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+        self.started_at = time.time()
+    
+    def _stage(self, name):
+        stage = self._stages.get(name)
+        if stage is None:
+            stage = self._stages[name] = {
+                "calls": 0, "errors": 0, "empty": 0, "bytes": 0,
+                "total_seconds": 0.0, "max_seconds": 0.0,
+                "buckets": [0] * (len(METRICS_LATENCY_BUCKETS) + 1)
+            }
+        return stage
+    
+    def record(self, name, seconds, error=False, empty=False):
+        with self._lock:
+            stage = self._stage(name)
+            stage["calls"] += 1
+            stage["errors"] += error
+            stage["empty"] += empty
+            stage["total_seconds"] += seconds
+            stage["max_seconds"] = max(stage["max_seconds"], seconds)
+            stage["buckets"][bisect_left(METRICS_LATENCY_BUCKETS, seconds)] += 1
+    
+    def add_bytes(self, name, count):
+        with self._lock:
+            self._stage(name)["bytes"] += count
+    
+    # Upper bound of the bucket holding the q-th quantile
+    @staticmethod
+    def _quantile(buckets, calls, q):
+        target = q * calls
+        seen = 0
+        for bound, count in zip(METRICS_LATENCY_BUCKETS + (float("inf"),), buckets):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+    
+    def snapshot(self):
+        with self._lock:
+            stages = {name: dict(stage, buckets=list(stage["buckets"])) for name, stage in self._stages.items()}
+        
+        for stage in stages.values():
+            calls = stage["calls"]
+            stage["error_rate"] = stage["errors"] / calls if calls else 0.0
+            stage["mean_seconds"] = stage["total_seconds"] / calls if calls else 0.0
+            for q in (50, 95, 99):
+                # A bucket bound can overshoot the slowest call actually seen
+                estimate = self._quantile(stage["buckets"], calls, q / 100) if calls else 0.0
+                stage[f"p{q}_seconds"] = min(estimate, stage["max_seconds"])
+        return {
+            "started_at": self.started_at,
+            "bucket_bounds": list(METRICS_LATENCY_BUCKETS),
+            "stages": stages
+        }
+    
+    def reset(self):
+        with self._lock:
+            self._stages = {}
+            self.started_at = time.time()
+    
+# Collects a cProfile run plus tracemalloc allocations between start() and stop()
+class ProfileCapture:
+    def __init__(self, trace_memory=True):
+        # One profiler, enabled by the thread that runs the batch. Python 3.12+
+        # allows only one active profiler per process, so lookup threads must
+        # never start their own; their time shows up as waits on the pool,
+        # and the per-stage metrics time each lookup.
+        self.trace_memory = trace_memory
+        self._profile = cProfile.Profile()
+        self._note = None
+        self.report = ""
+    
+    def start(self):
+        try:
+            self._profile.enable()
+        except ValueError as e:
+            # Another profiler (or another session's capture) is already running
+            self._profile = None
+            self._note = f"cProfile unavailable: {e}"
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self._started = time.perf_counter()
+        return self
+    
+    def stop(self):
+        elapsed = time.perf_counter() - self._started
+        lines = [f"Captured {elapsed:.2f}s of pipeline work"]
+        
+        if self._profile is not None:
+            self._profile.disable()
+            out = io.StringIO()
+            try:
+                pstats.Stats(self._profile, stream=out).sort_stats("cumulative").print_stats(PROFILE_REPORT_LINES)
+            except TypeError:
+                # Nothing was recorded
+                pass
+            lines.append(out.getvalue())
+        elif self._note:
+            lines.append(self._note)
+        
+        if self.trace_memory and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            lines.append(f"Memory: {current / 1e6:.1f} MB traced, {peak / 1e6:.1f} MB peak")
+            for stat in snapshot.statistics("lineno")[:PROFILE_REPORT_LINES]:
+                lines.append(str(stat))
+        
+        self.report = "\n".join(lines)
+        return self.report
+
+@st.cache_resource
+def _shared_pipeline_metrics():
+    return PipelineMetrics()
+
+_pipeline_metrics = None
+
+# Process-wide pipeline metrics, shared by every session and worker thread
+def get_metrics():
+    global _pipeline_metrics
+    if _pipeline_metrics is None:
+        _pipeline_metrics = _shared_pipeline_metrics()
+    return _pipeline_metrics
+
+# Decorator recording latency, calls, errors and empty results for a pipeline stage
+def instrumented(stage):
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            metrics = get_metrics()
+            started = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception:
+                metrics.record(stage, time.perf_counter() - started, error=True)
+                raise
+            metrics.record(stage, time.perf_counter() - started, empty=result is None)
+            return result
+        return wrapper
+    return decorate
+
+# Function to profile the pipeline work done inside a with block
+@contextmanager
+def capture_profile(trace_memory=True):
+    capture = ProfileCapture(trace_memory).start()
+    try:
+        yield capture
+    finally:
+        capture.stop()
+
+# Function to gather pipeline metrics and cache statistics into one JSON-ready dict
+def metrics_snapshot():
+    snapshot = get_metrics().snapshot()
+    snapshot["generated_at"] = time.time()
+    snapshot["enrichment_cache"] = get_enrichment_cache().stats()
+    return snapshot
+
+# Function to write the metrics snapshot to a JSON file
+def dump_metrics(path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(metrics_snapshot(), f, indent=2)
+
+# Enrichment cache settings: on-disk location, per-source TTLs (seconds) and size limits
+CACHE_PATH = os.getenv("ENRICHMENT_CACHE_PATH", ".enrichment_cache.sqlite3")
+CACHE_TTLS = {
+    "website": 7 * 24 * 3600,
+    "linkedin": 3 * 24 * 3600,
+    # Companies LinkedIn has no page for; kept briefly so a new page shows up soon
+    "linkedin_missing": 6 * 3600
+}
+CACHE_PAGE_TTL = 30 * 24 * 3600
+CACHE_MEMORY_ENTRIES = 4096
+CACHE_MAX_DISK_ENTRIES = 200000
+
+# Function to normalize a website URL to a bare domain (cache/dedup key)
+def normalize_domain(url):
+    domain = (url or "").strip().lower()
+    domain = re.sub(r"^[a-z][a-z0-9+.-]*://", "", domain)
+    domain = re.split(r"[/?#]", domain, maxsplit=1)[0]
+    domain = domain.rsplit("@", 1)[-1].rstrip(".")
+    if domain.startswith("www."):
+        domain = domain[4:]
+    return domain
+
+# Function to normalize a company name for lookups
+def normalize_company_name(name):
+    return re.sub(r"\s+", " ", name or "").strip().lower()
+
+# Two-tier cache for enrichment lookups: an in-process LRU in front of SQLite
+class EnrichmentCache:
+    def __init__(self, path=CACHE_PATH, ttls=None, memory_entries=CACHE_MEMORY_ENTRIES, max_disk_entries=CACHE_MAX_DISK_ENTRIES):
+        self.path = path
+        self.ttls = dict(CACHE_TTLS, **(ttls or {}))
+        self.memory_entries = memory_entries
+        self.max_disk_entries = max_disk_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes_since_evict = 0
+        self._counters = {}
+        
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS enrichment ("
+            "source TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "stored_at REAL NOT NULL, accessed_at REAL NOT NULL, "
+            "PRIMARY KEY (source, key))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS enrichment_accessed ON enrichment (accessed_at)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, page TEXT NOT NULL, fetched_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+    
+    def _count(self, source, counter):
+        counters = self._counters.setdefault(source, {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0})
+        counters[counter] += 1
+    
+    def _expired(self, source, stored_at, now):
+        ttl = self.ttls.get(source)
+        return ttl is not None and now - stored_at > ttl
+    
+    def _remember(self, source, key, stored_at, value):
+        self._memory[(source, key)] = (stored_at, value)
+        self._memory.move_to_end((source, key))
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+    
+    # Returns the cached value, or None on a miss. Values are shared between
+    # callers and must be treated as read-only.
+    def get(self, source, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get((source, key))
+            if entry is not None:
+                if not self._expired(source, entry[0], now):
+                    self._memory.move_to_end((source, key))
+                    self._count(source, "memory_hits")
+                    return entry[1]
+                del self._memory[(source, key)]
+            
+            row = self._conn.execute(
+                "SELECT value, stored_at FROM enrichment WHERE source = ? AND key = ?",
+                (source, key)
+            ).fetchone()
+            if row is None or self._expired(source, row[1], now):
+                self._count(source, "misses")
+                return None
+            
+            self._conn.execute(
+                "UPDATE enrichment SET accessed_at = ? WHERE source = ? AND key = ?",
+                (now, source, key)
+            )
+            self._conn.commit()
+            value = json.loads(row[0])
+            self._remember(source, key, row[1], value)
+            self._count(source, "disk_hits")
+            return value
+    
+    def set(self, source, key, value):
+        now = time.time()
+        payload = json.dumps(value)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO enrichment (source, key, value, stored_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (source, key, payload, now, now)
+            )
+            self._writes_since_evict += 1
+            if self._writes_since_evict >= 1000:
+                self._evict()
+            self._conn.commit()
+            self._remember(source, key, now, value)
+            self._count(source, "writes")
+    
+    # HTTP validators and parsed content of a crawled page, for conditional GETs
+    def get_page(self, url):
+        with self._lock:
+            row = self._conn.execute("SELECT etag, last_modified, page FROM pages WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        return {"etag": row[0], "last_modified": row[1], "page": json.loads(row[2])}
+    
+    def set_page(self, url, etag, last_modified, page):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (url, etag, last_modified, page, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (url, etag, last_modified, json.dumps(page), time.time())
+            )
+            self._conn.commit()
+    
+    def _evict(self):
+        self._writes_since_evict = 0
+        self._conn.execute("DELETE FROM pages WHERE fetched_at < ?", (time.time() - CACHE_PAGE_TTL,))
+        for source, ttl in self.ttls.items():
+            self._conn.execute("DELETE FROM enrichment WHERE source = ? AND stored_at < ?", (source, time.time() - ttl))
+        
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM enrichment").fetchone()
+        if count > self.max_disk_entries:
+            self._conn.execute(
+                "DELETE FROM enrichment WHERE rowid IN (SELECT rowid FROM enrichment ORDER BY accessed_at LIMIT ?)",
+                (count - self.max_disk_entries,)
+            )
+    
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._conn.execute("DELETE FROM enrichment")
+            self._conn.execute("DELETE FROM pages")
+            self._conn.commit()
+    
+    def stats(self):
+        with self._lock:
+            (disk_entries,) = self._conn.execute("SELECT COUNT(*) FROM enrichment").fetchone()
+            return {
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries,
+                "sources": {source: dict(counters) for source, counters in self._counters.items()}
+            }
+
+# Shared enrichment cache, kept across Streamlit reruns and sessions
+@st.cache_resource
+def get_enrichment_cache():
+    return EnrichmentCache(CACHE_PATH)
+
+# Read-only enrichment dataset, memory-mapped and shared by every session
+ENRICHMENT_STORE_PATH = os.getenv("ENRICHMENT_STORE_PATH", "")
+STORE_SOURCES = ("company", "website_data", "linkedin_data")
+
+# Per-field state of a stored record: key absent, explicit None, or a value
+STORE_MISSING, STORE_NULL, STORE_VALUE = 0, 1, 2
+
+# Arrays kept for each column kind, besides the per-row state
+STORE_PARTS = {
+    "int": ("values",),
+    "float": ("values",),
+    "bool": ("values",),
+    "str": ("codes",),
+    "json": ("codes",),
+    "strings": ("offsets", "items"),
+    "records": ("offsets",)
+}
+STORE_VALUE_TYPES = {"int": "int64", "float": "float64", "bool": "int8"}
+
+# Function to pick the column kind that can hold every value of a field
+def _store_kind(values):
+    kinds = set()
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            kinds.add("bool")
+        elif isinstance(value, int) and -2**63 <= value < 2**63:
+            kinds.add("int")
+        elif isinstance(value, float):
+            kinds.add("float")
+        elif isinstance(value, str):
+            kinds.add("str")
+        elif isinstance(value, list) and all(isinstance(item, str) for item in value):
+            kinds.add("strings")
+        elif isinstance(value, list) and all(isinstance(item, dict) and all(isinstance(v, str) for v in item.values()) for item in value):
+            kinds.add("records")
+        else:
+            kinds.add("json")
+    
+    # Empty lists look like lists of strings
+    if kinds == {"strings", "records"}:
+        return "records"
+    if len(kinds) > 1:
+        return "json"
+    return kinds.pop() if kinds else "str"
+
+# Function to write enriched records to a memory-mappable columnar store
+def write_enrichment_store(records, path):
+    # records is an iterable of (company, website_data, linkedin_data).
+    # Every string (names, technologies, services, executive titles, ...)
+    # is stored once in a sorted dictionary and referenced by integer id;
+    # list fields are offsets into flat id arrays.
+    fields = {source: {} for source in STORE_SOURCES}
+    # Rows whose source data is None (a failed lookup) rather than a record
+    nulls = {source: [] for source in STORE_SOURCES}
+    keys = {"name": {}, "domain": {}}
+    rows = 0
+    for row, record in enumerate(records):
+        for source, data in zip(STORE_SOURCES, record):
+            if data is None:
+                nulls[source].append(row)
+                continue
+            for field, value in data.items():
+                fields[source].setdefault(field, {})[row] = value
+        company = record[0]
+        keys["name"][normalize_company_name(company["name"])] = row
+        domain = normalize_domain(company.get("website"))
+        if domain:
+            keys["domain"][domain] = row
+        rows = row + 1
+    
+    # Codes are handed out in first-seen order, then remapped to sorted order
+    strings = {}
+    
+    def code(text):
+        return strings.setdefault(text, len(strings))
+    
+    schema = {"version": 2, "rows": rows, "sources": {}}
+    arrays = {}
+    for source, columns in fields.items():
+        present = np.ones(rows, dtype=np.int8)
+        present[nulls[source]] = 0
+        arrays[f"{source}.present"] = present
+        schema["sources"][source] = []
+        for i, (field, values) in enumerate(columns.items()):
+            kind = _store_kind(values.values())
+            name = f"{source}.{i}"
+            column = {"field": field, "kind": kind, "file": name}
+            
+            state = np.zeros(rows, dtype=np.int8)
+            for row, value in values.items():
+                state[row] = STORE_NULL if value is None else STORE_VALUE
+            present = sorted((row, value) for row, value in values.items() if value is not None)
+            arrays[f"{name}.state"] = state
+            
+            if kind in STORE_VALUE_TYPES:
+                data = np.zeros(rows, dtype=STORE_VALUE_TYPES[kind])
+                for row, value in present:
+                    data[row] = value
+                arrays[f"{name}.values"] = data
+            elif kind in ("str", "json"):
+                data = np.full(rows, -1, dtype=np.int64)
+                for row, value in present:
+                    data[row] = code(value if kind == "str" else json.dumps(value))
+                arrays[f"{name}.codes"] = data
+            else:
+                lengths = np.zeros(rows, dtype=np.int64)
+                for row, value in present:
+                    lengths[row] = len(value)
+                arrays[f"{name}.offsets"] = np.concatenate([[0], np.cumsum(lengths)])
+                if kind == "strings":
+                    arrays[f"{name}.items"] = np.array([code(item) for _, value in present for item in value], dtype=np.int64)
+                else:
+                    # Lists of flat dicts (e.g. key_executives) become one id array per key
+                    record_keys = list(dict.fromkeys(key for _, value in present for item in value for key in item))
+                    column["keys"] = record_keys
+                    for j, key in enumerate(record_keys):
+                        arrays[f"{name}.key{j}"] = np.array(
+                            [code(item[key]) if key in item else -1 for _, value in present for item in value],
+                            dtype=np.int64
+                        )
+            schema["sources"][source].append(column)
+    
+    for by, mapping in keys.items():
+        arrays[f"index.{by}.keys"] = np.array([code(key) for key in mapping], dtype=np.int64)
+        arrays[f"index.{by}.rows"] = np.array(list(mapping.values()), dtype=np.int32)
+    
+    # Remap codes so the dictionary is sorted and can be binary searched
+    ordered = sorted(strings, key=strings.get)
+    rank = np.empty(len(ordered) + 1, dtype=np.int32)
+    rank[np.argsort(np.array(ordered, dtype=object), kind="stable")] = np.arange(len(ordered), dtype=np.int32)
+    rank[-1] = -1
+    for name, data in arrays.items():
+        if data.dtype == np.int64 and not name.endswith((".offsets", ".values")):
+            arrays[name] = rank[data]
+    for by in keys:
+        order = np.argsort(arrays[f"index.{by}.keys"], kind="stable")
+        arrays[f"index.{by}.keys"] = arrays[f"index.{by}.keys"][order]
+        arrays[f"index.{by}.rows"] = arrays[f"index.{by}.rows"][order]
+    
+    encoded = [text.encode("utf-8") for text in sorted(strings)]
+    arrays["strings.offsets"] = np.concatenate([[0], np.cumsum([len(text) for text in encoded], dtype=np.int64)]).astype(np.int64)
+    arrays["strings.data"] = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    
+    # Build next to the target and swap it in, so readers never see a partial store
+    staging = tempfile.mkdtemp(prefix=".store-", dir=os.path.dirname(os.path.abspath(path)))
+    for name, data in arrays.items():
+        np.save(os.path.join(staging, f"{name}.npy"), data)
+    with open(os.path.join(staging, "schema.json"), "w", encoding="utf-8") as f:
+        json.dump(schema, f, indent=2)
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.replace(staging, path)
+    return rows
+
+# Memory-mapped columnar store of enriched companies; the OS page cache
+# holds one copy of the data no matter how many sessions read it
+class EnrichmentStore:
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "schema.json"), encoding="utf-8") as f:
+            schema = json.load(f)
+        self.rows = schema["rows"]
+        self._offsets = self._load("strings.offsets")
+        self._data = self._load("strings.data")
+        
+        self.columns = {}
+        for source, columns in schema["sources"].items():
+            self.columns[source] = {}
+            for column in columns:
+                parts = STORE_PARTS[column["kind"]] + tuple(f"key{j}" for j in range(len(column.get("keys", []))))
+                column = dict(column, state=self._load(f"{column['file']}.state"))
+                column.update({part: self._load(f"{column['file']}.{part}") for part in parts})
+                self.columns[source][column["field"]] = column
+        # Version 1 stores kept no flag; a row with no fields stands for None there
+        if schema.get("version", 1) >= 2:
+            self._present = {source: self._load(f"{source}.present") for source in schema["sources"]}
+        else:
+            self._present = {
+                source: np.any([column["state"] != STORE_MISSING for column in columns.values()], axis=0) if columns else np.zeros(self.rows, dtype=bool)
+                for source, columns in self.columns.items()
+            }
+        self._indexes = {by: (self._load(f"index.{by}.keys"), self._load(f"index.{by}.rows")) for by in ("name", "domain")}
+    
+    def _load(self, name):
+        # Plain ndarray views over the mapping index much faster than np.memmap
+        return np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r").view(np.ndarray)
+    
+    def __len__(self):
+        return self.rows
+    
+    def string(self, code):
+        return bytes(self._data[self._offsets[code]:self._offsets[code + 1]]).decode("utf-8")
+    
+    # Binary search over the sorted dictionary; -1 if the string is not stored
+    def code(self, text):
+        lo, hi = 0, len(self._offsets) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.string(mid) < text:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < len(self._offsets) - 1 and self.string(lo) == text else -1
+    
+    def find(self, by, key):
+        code = self.code(key)
+        if code < 0:
+            return None
+        codes, rows = self._indexes[by]
+        i = np.searchsorted(codes, code)
+        return int(rows[i]) if i < len(codes) and codes[i] == code else None
+    
+    def state(self, source, field, row):
+        return self.columns[source][field]["state"][row]
+    
+    def value(self, source, field, row):
+        column = self.columns[source][field]
+        state = column["state"][row]
+        if state != STORE_VALUE:
+            return None
+        
+        kind = column["kind"]
+        if kind == "int":
+            return int(column["values"][row])
+        if kind == "float":
+            return float(column["values"][row])
+        if kind == "bool":
+            return bool(column["values"][row])
+        if kind == "str":
+            return self.string(column["codes"][row])
+        if kind == "json":
+            return json.loads(self.string(column["codes"][row]))
+        
+        start, stop = column["offsets"][row], column["offsets"][row + 1]
+        if kind == "strings":
+            return [self.string(code) for code in column["items"][start:stop]]
+        items = [{} for _ in range(stop - start)]
+        for j, key in enumerate(column["keys"]):
+            for item, code in zip(items, column[f"key{j}"][start:stop]):
+                if code >= 0:
+                    item[key] = self.string(code)
+        return items
+    
+    # Function to view one stored record; None where the source itself was None
+    def record(self, row, source):
+        if row is None or not self._present[source][row]:
+            return None
+        return StoredRecord(self, source, row)
+    
+    def records(self):
+        for row in range(self.rows):
+            yield tuple(self.record(row, source) for source in STORE_SOURCES)
+    
+    def company(self, name):
+        return self.record(self.find("name", normalize_company_name(name)), "company")
+    
+    def website(self, url):
+        return self.record(self.find("domain", normalize_domain(url)), "website_data")
+    
+    def linkedin(self, name):
+        return self.record(self.find("name", normalize_company_name(name)), "linkedin_data")
+
+# Read-only dict-like view of one stored record; fields are decoded on access
+class StoredRecord(Mapping):
+    __slots__ = ("_store", "_source", "_row")
+    
+    def __init__(self, store, source, row):
+        self._store = store
+        self._source = source
+        self._row = row
+    
+    def __getitem__(self, field):
+        if field not in self._store.columns[self._source] or self._store.state(self._source, field, self._row) == STORE_MISSING:
+            raise KeyError(field)
+        return self._store.value(self._source, field, self._row)
+    
+    def __iter__(self):
+        return (field for field in self._store.columns[self._source] if self._store.state(self._source, field, self._row) != STORE_MISSING)
+    
+    def __len__(self):
+        return sum(1 for _ in self)
+    
+    def __repr__(self):
+        return f"StoredRecord({dict(self)!r})"
+
+# Function to JSON-encode values json.dumps can't, such as stored record views
+def _json_default(value):
+    if isinstance(value, Mapping):
+        return dict(value)
+    return str(value)
+
+@st.cache_resource
+def _open_enrichment_store(path, mtime):
+    return EnrichmentStore(path)
+
+# Shared enrichment store, or None if none is configured or built yet
+def get_enrichment_store(path=ENRICHMENT_STORE_PATH):
+    schema = os.path.join(path, "schema.json")
+    if not path or not os.path.exists(schema):
+        return None
+    return _open_enrichment_store(path, os.path.getmtime(schema))
+
+# Demo companies, searched when no company corpus is configured
+MOCK_COMPANIES = [
+    {
+        "name": "Digital Growth Partners",
+        "website": "digitalgrowthpartners.com",
+        "employees": 75,
+        "location": "Boston, MA",
+        "industry": "Digital Marketing",
+        "description": "Full-service digital marketing agency specializing in SEO, PPC, and CRM implementation",
+        "founded": 2012,
+        "specializations": ["Digital Marketing", "CRM Implementation", "Content Marketing"]
+    },
+    {
+        "name": "RevOps Solutions Inc.",
+        "website": "revopssolutions.com",
+        "employees": 120,
+        "location": "Austin, TX",
+        "industry": "Business Consulting",
+        "description": "Revenue Operations consultancy helping enterprise businesses align sales, marketing and customer service",
+        "founded": 2015,
+        "specializations": ["RevOps", "CRM Implementation", "Marketing Automation"]
+    },
+    {
+        "name": "Enterprise CRM Experts",
+        "website": "enterprisecrm.co",
+        "employees": 65,
+        "location": "Chicago, IL",
+        "industry": "Technology Consulting",
+        "description": "CRM implementation specialists for mid-market and enterprise companies",
+        "founded": 2010,
+        "specializations": ["CRM Implementation", "Systems Integration", "Custom Development"]
+    }
+]
+
+# Local company corpus (CSV or Parquet) backing search_companies
+COMPANY_CORPUS_PATH = os.getenv("COMPANY_CORPUS_PATH", "")
+COMPANY_COLUMNS = ["name", "website", "employees", "location", "industry", "description", "founded", "specializations"]
+SEARCH_RESULT_LIMIT = 50
+
+# How much a keyword hit counts, by the field it was found in
+SEARCH_FIELD_WEIGHTS = {"name": 3.0, "specializations": 2.0, "description": 1.0}
+
+SEARCH_TOKEN_PATTERN = r"[a-z0-9]+"
+SEARCH_STOPWORDS = {"a", "an", "and", "the", "of", "for", "in", "to", "with", "on", "at", "by", "inc", "llc", "ltd"}
+
+# Function to split a query or field into lowercase search tokens
+def tokenize(text):
+    return [t for t in re.findall(SEARCH_TOKEN_PATTERN, (text or "").lower()) if t not in SEARCH_STOPWORDS]
+
+# Function to load a company corpus into a frame with the search_companies columns
+def load_company_corpus(path):
+    if path.endswith(".parquet"):
+        frame = pd.read_parquet(path)
+    else:
+        frame = pd.read_csv(path, dtype={"name": str, "website": str, "location": str, "industry": str, "description": str})
+    
+    for column in COMPANY_COLUMNS:
+        if column not in frame.columns:
+            frame[column] = None
+    frame = frame[COMPANY_COLUMNS].reset_index(drop=True)
+    
+    # CSV corpora store specializations as a ';'-separated string
+    frame["specializations"] = frame["specializations"].map(
+        lambda value: [s.strip() for s in value.split(";") if s.strip()] if isinstance(value, str) else list(value) if value is not None and not isinstance(value, float) else []
+    )
+    frame["employees"] = pd.to_numeric(frame["employees"], errors="coerce").fillna(0).astype("int64")
+    for column in ("name", "website", "location", "industry", "description"):
+        frame[column] = frame[column].fillna("")
+    return frame
+
+# Inverted keyword index plus columnar filters over a company corpus
+class CompanyIndex:
+    def __init__(self, frame):
+        self.frame = frame
+        self.size = len(frame)
+        self._columns = {column: frame[column].to_numpy() for column in COMPANY_COLUMNS}
+        
+        texts = {
+            "name": frame["name"],
+            "specializations": frame["specializations"].map(" ".join),
+            "description": frame["description"]
+        }
+        self._keywords = self._build_postings(texts, SEARCH_FIELD_WEIGHTS)
+        self._locations = self._build_postings({"location": frame["location"]}, {"location": 1.0})
+        
+        # Industry filter: exact (case-insensitive) match via category codes
+        codes, labels = pd.factorize(frame["industry"].str.lower().str.strip())
+        order = np.argsort(codes, kind="stable").astype(np.int32)
+        bounds = np.searchsorted(codes[order], np.arange(len(labels) + 1))
+        self._industries = {label: order[bounds[i]:bounds[i + 1]] for i, label in enumerate(labels)}
+        
+        # Employee range filter: doc ids sorted by employee count
+        self._employees = self._columns["employees"].astype(np.int64)
+        self._by_employees = np.argsort(self._employees, kind="stable").astype(np.int32)
+        self._sorted_employees = self._employees[self._by_employees]
+    
+    # Builds token -> (sorted doc ids, weights) from whole columns at once
+    def _build_postings(self, texts, weights):
+        pairs = []
+        for field, series in texts.items():
+            tokens = series.str.lower().str.findall(SEARCH_TOKEN_PATTERN).explode().dropna()
+            pairs.append(pd.DataFrame({"token": tokens.to_numpy(), "doc": tokens.index.to_numpy(), "weight": weights[field]}))
+        
+        pairs = pd.concat(pairs, ignore_index=True)
+        pairs = pairs[~pairs["token"].isin(SEARCH_STOPWORDS)]
+        codes, vocabulary = pd.factorize(pairs["token"])
+        docs = pairs["doc"].to_numpy(np.int32)
+        weights = pairs["weight"].to_numpy(np.float32)
+        
+        # Sort by (token, doc, best weight first); a token found in several
+        # fields of one company counts once, at its best weight
+        order = np.lexsort((-weights, docs, codes))
+        codes, docs, weights = codes[order], docs[order], weights[order]
+        first = np.r_[True, (codes[1:] != codes[:-1]) | (docs[1:] != docs[:-1])]
+        codes, docs, weights = codes[first], docs[first], weights[first]
+        
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.array([], dtype=np.int64)
+        ends = np.r_[starts[1:], len(codes)]
+        tokens = vocabulary[codes[starts]] if len(codes) else []
+        return {token: (docs[s:e], weights[s:e]) for token, s, e in zip(tokens, starts, ends)}
+    
+    def search(self, query="", location=None, industry=None, min_employees=None, max_employees=None, limit=SEARCH_RESULT_LIMIT):
+        candidates = None
+        scores = None
+        
+        # Relevance: idf-weighted sum over query tokens, accumulated per doc
+        tokens = [t for t in dict.fromkeys(tokenize(query)) if t in self._keywords]
+        if tokens:
+            totals = np.zeros(self.size, dtype=np.float32)
+            for token in tokens:
+                docs, weights = self._keywords[token]
+                idf = np.log1p((self.size - len(docs) + 0.5) / (len(docs) + 0.5))
+                totals[docs] += weights * idf
+            candidates = np.flatnonzero(totals).astype(np.int32)
+            scores = totals[candidates]
+        elif tokenize(query):
+            return []
+        
+        filters = []
+        if industry:
+            filters.append(self._industries.get(industry.lower().strip(), np.array([], dtype=np.int32)))
+        for token in tokenize(location):
+            filters.append(self._locations.get(token, (np.array([], dtype=np.int32),))[0])
+        if min_employees is not None or max_employees is not None:
+            lo = np.searchsorted(self._sorted_employees, min_employees, side="left") if min_employees is not None else 0
+            hi = np.searchsorted(self._sorted_employees, max_employees, side="right") if max_employees is not None else self.size
+            filters.append(np.sort(self._by_employees[lo:hi]))
+        
+        # Intersect with the smallest posting lists first
+        for ids in sorted(filters, key=len):
+            if candidates is None:
+                candidates = ids
+                continue
+            keep = np.isin(candidates, ids, assume_unique=True)
+            candidates = candidates[keep]
+            if scores is not None:
+                scores = scores[keep]
+        
+        if candidates is None:
+            candidates = np.arange(min(limit, self.size), dtype=np.int32)
+        
+        # Top-k without a full sort; ties broken by company size
+        if scores is None:
+            scores = np.zeros(len(candidates), dtype=np.float32)
+        if len(candidates) > limit:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+            candidates, scores = candidates[top], scores[top]
+        order = np.lexsort((-self._employees[candidates], -scores))
+        return [self.record(i) for i in candidates[order]]
+    
+    def record(self, i):
+        company = {column: self._columns[column][i] for column in COMPANY_COLUMNS}
+        company["employees"] = int(company["employees"])
+        company["founded"] = None if pd.isna(company["founded"]) else int(company["founded"])
+        company["specializations"] = [str(s) for s in company["specializations"]]
+        return company
+
+@st.cache_resource
+def _load_company_index(path, mtime):
+    frame = load_company_corpus(path) if path else pd.DataFrame(MOCK_COMPANIES, columns=COMPANY_COLUMNS)
+    return CompanyIndex(frame)
+
+# Shared search index, rebuilt only when the corpus file changes
+def get_company_index(path=COMPANY_CORPUS_PATH):
+    return _load_company_index(path, os.path.getmtime(path) if path else None)
+
+# Function to parse a company size option such as "51-200" or "1001+"
+def parse_size_range(option):
+    numbers = [int(n) for n in re.findall(r"\d+", option or "")]
+    if not numbers:
+        return None, None
+    return numbers[0], numbers[1] if len(numbers) > 1 else None
+
+# Legal-form suffixes ignored when comparing company names
+LEGAL_SUFFIXES = {
+    "inc", "incorporated", "llc", "llp", "lp", "ltd", "limited", "corp", "corporation", "co", "company",
+    "plc", "gmbh", "ag", "sa", "sas", "sarl", "srl", "spa", "bv", "nv", "oy", "ab", "as", "pty", "pte"
+}
+
+# Domains whose pages (social profiles, hosted sites) belong to unrelated companies;
+# a website on one of these only identifies a company by its bare domain
+SHARED_DOMAINS = {"linkedin.com", "facebook.com", "twitter.com", "x.com", "instagram.com", "google.com", "sites.google.com"}
+
+# Entity resolution: character shingle size, MinHash signature length split into
+# LSH bands, and the name similarity (Jaccard of shingles) above which two
+# records with compatible domains are the same company
+RESOLVE_SHINGLE_SIZE = 3
+RESOLVE_PERMUTATIONS = 32
+RESOLVE_BANDS = 8
+RESOLVE_NAME_SIMILARITY = 0.8
+
+# Function to reduce a company name to its comparison key, e.g.
+# "RevOps Solutions, Inc." -> "revops solutions"
+def entity_name_key(name):
+    tokens = re.findall(r"[a-z0-9]+", normalize_company_name(name).replace("&", " and "))
+    while len(tokens) > 1 and tokens[-1] in LEGAL_SUFFIXES:
+        tokens.pop()
+    return " ".join(tokens)
+
+# Function to reduce a website to its identity domain ("" when it can't identify a company)
+def entity_domain(url):
+    domain = normalize_domain(url)
+    if domain in SHARED_DOMAINS:
+        path = re.sub(r"^[a-z][a-z0-9+.-]*://", "", (url or "").strip().lower()).partition("/")[2]
+        if path.strip("/"):
+            return ""
+    return domain
+
+# Function to split a name key into character shingles
+def _name_shingles(key):
+    padded = f" {key} "
+    return {padded[i:i + RESOLVE_SHINGLE_SIZE] for i in range(max(1, len(padded) - RESOLVE_SHINGLE_SIZE + 1))}
+
+# Function to merge duplicate records into the first one, filling its gaps from the others
+def merge_company_records(records):
+    merged = dict(records[0])
+    for record in records[1:]:
+        for field, value in record.items():
+            if field == "specializations":
+                merged[field] = list(merged.get(field) or []) + [s for s in value or [] if s not in (merged.get(field) or [])]
+            elif field == "employees":
+                merged[field] = max(merged.get(field) or 0, value or 0)
+            elif not merged.get(field) and value:
+                merged[field] = value
+    return merged
+
+# Incremental entity resolution over company records. Blocking on the exact
+# domain and name key catches most duplicates; MinHash/LSH over name shingles
+# finds near-duplicate names ("RevOps Solutions Inc." / "Revops Solutions")
+# without comparing every pair. Matches are joined with union-find, so the
+# first record seen stays the representative of its company.
+class EntityResolver:
+    def __init__(self, threshold=RESOLVE_NAME_SIMILARITY, permutations=RESOLVE_PERMUTATIONS, bands=RESOLVE_BANDS, seed=1):
+        self.threshold = threshold
+        self.bands = bands
+        self._prime = (1 << 31) - 1
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, self._prime, permutations, dtype=np.uint64)
+        self._b = rng.integers(0, self._prime, permutations, dtype=np.uint64)
+        
+        self.records = []
+        self._known = []
+        self._keys = []
+        self._domains = []
+        self._parent = []
+        # The website of each union-find root's company ("" while none is known)
+        self._root_domain = []
+        self._by_domain = {}
+        self._by_name = {}
+        self._buckets = {}
+        self.duplicates = 0
+    
+    def __len__(self):
+        return len(self.records)
+    
+    def _find(self, i):
+        parent = self._parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    
+    # Function to join the companies of records i and j; refuses (returns False)
+    # when they already have different websites, so a record without one can't
+    # bridge two different companies
+    def _union(self, i, j):
+        i, j = self._find(i), self._find(j)
+        if i == j:
+            return True
+        if self._root_domain[i] and self._root_domain[j] and self._root_domain[i] != self._root_domain[j]:
+            return False
+        # The earlier record stays the representative
+        root, child = min(i, j), max(i, j)
+        self._parent[child] = root
+        self._root_domain[root] = self._root_domain[root] or self._root_domain[child]
+        return True
+    
+    def _band_keys(self, key):
+        # crc32 rather than hash(), so signatures don't depend on PYTHONHASHSEED
+        hashes = np.array([zlib.crc32(shingle.encode("utf-8")) for shingle in _name_shingles(key)], dtype=np.uint64)
+        signature = ((hashes[:, None] * self._a + self._b) % self._prime).min(axis=0)
+        return [(band, rows.tobytes()) for band, rows in enumerate(signature.reshape(self.bands, -1))]
+    
+    def _compatible(self, i, domain):
+        # Two different websites are two different companies, however similar the names
+        return not domain or not self._domains[i] or self._domains[i] == domain
+    
+    def _same_numbers(self, i, key):
+        # "Studio 9" and "Studio 99" share most shingles but aren't the same company
+        return re.findall(r"\d+", self._keys[i]) == re.findall(r"\d+", key)
+    
+    # Function to add a record; returns (representative index, whether it
+    # matched a company already seen)
+    def add(self, company, known=False):
+        i = len(self.records)
+        key = entity_name_key(company.get("name"))
+        domain = entity_domain(company.get("website"))
+        self.records.append(company)
+        self._known.append(known)
+        self._keys.append(key)
+        self._domains.append(domain)
+        self._parent.append(i)
+        self._root_domain.append(domain)
+        
+        matches = set()
+        if domain in self._by_domain:
+            matches.add(self._by_domain[domain])
+        if key in self._by_name and self._compatible(self._by_name[key], domain):
+            matches.add(self._by_name[key])
+        
+        band_keys = self._band_keys(key)
+        candidates = {j for band_key in band_keys for j in self._buckets.get(band_key, ())}
+        if candidates - matches:
+            shingles = _name_shingles(key)
+            for j in candidates - matches:
+                if not self._compatible(j, domain) or not self._same_numbers(j, key):
+                    continue
+                other = _name_shingles(self._keys[j])
+                if len(shingles & other) / len(shingles | other) >= self.threshold:
+                    matches.add(j)
+        
+        # Exact domain matches first: they decide the website of i's company
+        matched = False
+        for j in sorted(matches, key=lambda j: self._domains[j] != domain):
+            matched = self._union(i, j) or matched
+        if domain:
+            self._by_domain.setdefault(domain, i)
+        self._by_name.setdefault(key, i)
+        for band_key in band_keys:
+            self._buckets.setdefault(band_key, []).append(i)
+        
+        if matched:
+            self.duplicates += 1
+        return self._find(i), matched
+    
+    # Function to list the resolved companies in first-seen order, each merged
+    # from its duplicates; returns (companies, aliases) where aliases maps every
+    # collapsed name to the name kept. Companies made only of known records
+    # are left out.
+    def resolved(self):
+        groups = {}
+        for i in range(len(self.records)):
+            groups.setdefault(self._find(i), []).append(i)
+        
+        companies = []
+        aliases = {}
+        for root, members in groups.items():
+            if all(self._known[i] for i in members):
+                continue
+            merged = merge_company_records([self.records[i] for i in members])
+            companies.append(merged)
+            for i in members:
+                if self.records[i]["name"] != merged["name"]:
+                    aliases[self.records[i]["name"]] = merged["name"]
+        return companies, aliases
+
+# Function to collapse duplicate companies before enrichment. Records in known
+# (e.g. companies already analyzed) win as representatives but are only
+# returned when something in companies resolved to them.
+def resolve_companies(companies, known=()):
+    resolver = EntityResolver()
+    for company in known:
+        resolver.add(company, known=True)
+    for company in companies:
+        resolver.add(company)
+    return resolver.resolved()
+
+# Function to drop companies already seen earlier in a stream, so duplicates
+# are never enriched; the resolver keeps count of what was dropped
+def iter_unique_companies(companies, resolver=None):
+    resolver = resolver if resolver is not None else EntityResolver()
+    for company in companies:
+        _, duplicate = resolver.add(company)
+        if not duplicate:
+            yield company
+
+# Function to search for companies
+@instrumented("search_companies")
+def search_companies(query, location=None, industry=None, api_key=None, min_employees=None, max_employees=None, limit=SEARCH_RESULT_LIMIT):
+    logger.info("Searching for companies matching: %s", query)
+    
+    # Searches the local corpus index; without a corpus the demo companies
+    # are searched so the app still works out of the box
+    if not COMPANY_CORPUS_PATH:
+        logger.warning("No company corpus configured (COMPANY_CORPUS_PATH). Searching demo data.")
+    
+    # The corpus can list a company more than once ("Acme Inc." and "Acme")
+    companies, _ = resolve_companies(get_company_index().search(query, location, industry, min_employees, max_employees, limit))
+    return companies
+
+# Function to scrape company website
+@instrumented("scrape_company_website")
+def scrape_company_website(url):
+    # Companies in the shared store are served from it without a copy
+    store = get_enrichment_store()
+    stored = store.website(url) if store else None
+    if stored is not None:
+        return stored
+    
+    cache = get_enrichment_cache()
+    cache_key = normalize_domain(url)
+    cached = cache.get("website", cache_key)
+    if cached is not None:
+        return cached
+    
+    website_data = _fetch_company_website(url)
+    if website_data is not None:
+        cache.set("website", cache_key, website_data)
+    return website_data
+
+# Mock website data for the demo companies, used when their sites can't be reached
+MOCK_WEBSITE_DATA = {
+    "digitalgrowthpartners.com": {
+        "technologies": ["Salesforce", "Marketo", "Google Analytics", "WordPress"],
+        "services": ["SEO", "PPC", "Content Marketing", "Email Marketing", "CRM Implementation"],
+        "target_industries": ["SaaS", "Healthcare", "Finance"],
+        "case_studies": 12,
+        "team_size_mentioned": "70+ professionals",
+        "enterprise_focus": True
+    },
+    "revopssolutions.com": {
+        "technologies": ["HubSpot", "Salesforce", "Tableau", "Zapier"],
+        "services": ["RevOps Consulting", "CRM Implementation", "Sales Enablement", "Marketing Automation"],
+        "target_industries": ["Technology", "Manufacturing", "Professional Services"],
+        "case_studies": 8,
+        "team_size_mentioned": "Over 100 consultants",
+        "enterprise_focus": True
+    },
+    "enterprisecrm.co": {
+        "technologies": ["Salesforce", "Microsoft Dynamics", "Oracle", "SAP"],
+        "services": ["CRM Strategy", "Implementation", "Training", "Support"],
+        "target_industries": ["Healthcare", "Financial Services", "Manufacturing"],
+        "case_studies": 15,
+        "team_size_mentioned": "60+ specialists",
+        "enterprise_focus": True
+    }
+}
+
+def _fetch_company_website(url):
+    logger.info("Analyzing website: %s", url)
+    
+    try:
+        website_data = get_website_crawler().crawl(url)
+    except Exception as e:
+        logger.error("Error scraping website %s: %s", url, e)
+        return None
+    
+    if website_data is None and normalize_domain(url) in MOCK_WEBSITE_DATA:
+        logger.warning("Could not reach %s. Using mock data.", url)
+        return MOCK_WEBSITE_DATA[normalize_domain(url)]
+    
+    return website_data
+
+# Website crawler settings
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", "4"))
+CRAWL_DELAY = float(os.getenv("CRAWL_DELAY", "1.0"))
+CRAWL_HOST_CONCURRENCY = 2
+CRAWL_POOL_HOSTS = 256
+CRAWL_TIMEOUT = 10
+CRAWL_MAX_BYTES = 1_000_000
+CRAWL_CHUNK_SIZE = 16384
+CRAWL_USER_AGENT = "HubSpotPartnerFinder/1.0 (+https://github.com/Opeid/AI-Powered-HubSpot-Partner-Finder)"
+
+# Which internal links are worth following, in priority order
+CRAWL_LINK_HINTS = ["service", "solution", "case-stud", "customer", "industr", "about", "partner", "work"]
+
+# Links that point at individual case studies / customer stories
+CASE_STUDY_LINK_PATTERN = re.compile(r"/(?:case-stud(?:y|ies)|customer-stor(?:y|ies)|success-stor(?:y|ies)|clients?)/[^/?#]+", re.IGNORECASE)
+
+TEAM_SIZE_PATTERN = re.compile(
+    r"(?:over\s+)?\d{2,5}\+?\s+(?:professionals|consultants|specialists|experts|employees|people|team members)",
+    re.IGNORECASE
 )
 
-# Define the IPP criteria
-IPP_CRITERIA = {
-    "Company Profile": [
-        "51+ employees",
-        "Clear organizational structure (Marketing, Sales, Professional Services, Customer Success)",
-        "Offers enterprise software and related services",
-        "Established processes for marketing planning, sales, SaaS implementation, and customer lifecycle management"
-    ],
-    "Customer Focus": [
-        "Targets customers with 201+ employees",
-        "Supports environments with 101+ users",
-        "Manages full customer lifecycle",
-        "Focuses on specific industries with deep expertise"
-    ],
-    "Tech Stack Expertise": [
-        "Expertise in enterprise software tools",
-        "Can develop custom integrations using APIs/SDKs",
-        "Participates in partner programs from enterprise software vendors"
-    ],
-    "Strategic Alignment": [
-        "Has executive sponsors for partnerships",
-        "Has established or willing to establish HubSpot practice",
-        "Committed to invest resources in HubSpot partnership"
-    ],
-    "Specializations": [
-        "Digital Marketing (SEO, PPC, Social Media, Content, Email)",
-        "CRM Implementation and Optimization",
-        "RevOps (Revenue Operations)"
-    ]
-}
+# Keywords that identify technologies in page markup (script URLs, meta tags,
+# response headers, text)
+TECHNOLOGY_KEYWORDS = {
+    "HubSpot": ["hubspot", "hs-scripts.com", "hs-analytics.net", "hsforms", "x-hs-hub-id", "x-hs-content-id"],
+    "Salesforce": ["salesforce", "force.com", "pardot", "x-sfdc-"],
+    "Marketo": ["marketo", "munchkin"],
+    "Microsoft Dynamics": ["microsoft dynamics", "dynamics 365"],
+    "Oracle": ["oracle", "eloqua"],
+    "SAP": ["sap ", "sap-", "successfactors"],
+    "Adobe": ["adobe experience", "adobedtm", "omniture"],
+    "Google Analytics": ["google-analytics.com", "googletagmanager.com", "gtag("],
+    "WordPress": ["wp-content", "wp-includes", "wordpress", "x-pingback", "wp-json"],
+    "Tableau": ["tableau"],
+    "Zapier": ["zapier"],
+    "Shopify": ["shopify", "x-shopid"]
+}
+
+SERVICE_KEYWORDS = {
+    "SEO": ["seo", "search engine optimization"],
+    "PPC": ["ppc", "pay-per-click", "paid search"],
+    "Content Marketing": ["content marketing", "content strategy"],
+    "Email Marketing": ["email marketing"],
+    "Social Media": ["social media"],
+    "CRM Implementation": ["crm implementation", "crm migration", "crm consulting"],
+    "RevOps Consulting": ["revops", "revenue operations"],
+    "Marketing Automation": ["marketing automation"],
+    "Sales Enablement": ["sales enablement"],
+    "Systems Integration": ["integration"],
+    "Custom Development": ["custom development", "api development"],
+    "Training": ["training"],
+    "Support": ["managed services", "support"]
+}
+
+INDUSTRY_KEYWORDS = {
+    "SaaS": ["saas", "software companies"],
+    "Technology": ["technology companies", "tech companies"],
+    "Healthcare": ["healthcare", "life sciences"],
+    "Financial Services": ["financial services", "fintech", "banking"],
+    "Manufacturing": ["manufacturing"],
+    "Professional Services": ["professional services"],
+    "Retail": ["retail", "ecommerce", "e-commerce"],
+    "Education": ["education", "higher ed"],
+    "Real Estate": ["real estate"],
+    "Nonprofit": ["nonprofit", "non-profit"]
+}
+
+ENTERPRISE_KEYWORDS = ["enterprise", "fortune 500", "fortune 1000", "mid-market"]
+
+# Signature database compiled into one trie-shaped regex. A page is scanned
+# once, and the work per character depends on the longest signature rather
+# than on how many signatures there are.
+class SignatureMatcher:
+    def __init__(self, tables):
+        # tables maps a field to a keyword table ({label: [keyword, ...]})
+        self.tables = tables
+        trie = {}
+        for field, table in tables.items():
+            for label, keywords in table.items():
+                for keyword in keywords:
+                    node = trie
+                    for char in keyword.lower():
+                        node = node.setdefault(char, {})
+                    node.setdefault(None, set()).add((field, label))
+        
+        # The regex reports the longest signature starting at each position;
+        # _hits maps it to every (field, label) whose signature is a prefix
+        # of it, so a shorter signature at the same position isn't lost
+        self._hits = {}
+        self._collect(trie, "", frozenset())
+        # The lookahead makes matches zero-width, so signatures that overlap
+        # ("email marketing automation") are all found
+        self.pattern = re.compile(f"(?=({self._pattern(trie)}))")
+    
+    def _collect(self, node, prefix, hits):
+        if None in node:
+            hits = hits | node[None]
+            self._hits[prefix] = hits
+        for char, child in node.items():
+            if char is not None:
+                self._collect(child, prefix + char, hits)
+    
+    def _pattern(self, node):
+        branches = [re.escape(char) + self._pattern(child) for char, child in sorted(node.items(), key=lambda item: item[0] or "") if char is not None]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        # Greedy: the longer signature is tried before stopping at this one
+        return f"(?:{body})?" if None in node else body
+    
+    # Function to find which labels of each table occur in lowercased text
+    def scan(self, text):
+        found = {field: set() for field in self.tables}
+        for signature in {match.group(1) for match in self.pattern.finditer(text)}:
+            for field, label in self._hits[signature]:
+                found[field].add(label)
+        return found
+
+# Compiled matchers for page text and for markup plus response headers. Built
+# on the first crawl and kept across reruns, which would otherwise rebuild them.
+@st.cache_resource
+def _compile_page_signatures():
+    page = SignatureMatcher({
+        "technologies": TECHNOLOGY_KEYWORDS,
+        "services": SERVICE_KEYWORDS,
+        "target_industries": INDUSTRY_KEYWORDS,
+        "enterprise_focus": {True: ENTERPRISE_KEYWORDS}
+    })
+    return page, SignatureMatcher({"technologies": TECHNOLOGY_KEYWORDS})
+
+_page_signatures = None
+
+def get_page_signatures():
+    global _page_signatures
+    if _page_signatures is None:
+        _page_signatures = _compile_page_signatures()
+    return _page_signatures
+
+# Function to list the labels found, in keyword table order
+def _ordered_labels(table, found):
+    return [label for label in table if label in found]
+
+# Incremental HTML parser: fed chunk by chunk while the response streams in
+class PageParser(HTMLParser):
+    def __init__(self, base_url):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.text = []
+        self.markup = []
+        self.links = []
+        self._skip = 0
+    
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag in ("script", "style", "noscript"):
+            self._skip += 1
+        if tag == "a" and attrs.get("href"):
+            self.links.append(urljoin(self.base_url, attrs["href"]))
+        if tag in ("script", "link", "iframe", "img") and (attrs.get("src") or attrs.get("href")):
+            self.markup.append(attrs.get("src") or attrs.get("href"))
+        if tag == "meta" and attrs.get("content"):
+            self.markup.append(attrs["content"])
+    
+    def handle_endtag(self, tag):
+        if tag in ("script", "style", "noscript") and self._skip:
+            self._skip -= 1
+    
+    def handle_data(self, data):
+        if self._skip:
+            self.markup.append(data)
+        else:
+            self.text.append(data)
+
+# Function to reduce a parsed page to the signals used for website_data
+def _summarize_page(parser, host, headers=""):
+    text = " ".join(" ".join(parser.text).split())
+    lowered = text.lower()
+    # Trailing space so "sap " can still end the markup, as it could when the
+    # markup and text were searched together
+    markup = " ".join(parser.markup + [headers, ""]).lower()
+    page_signatures, markup_signatures = get_page_signatures()
+    found = page_signatures.scan(lowered)
+    technologies = found["technologies"] | markup_signatures.scan(markup)["technologies"]
+    
+    links = []
+    case_studies = []
+    for link in parser.links:
+        parsed = urlparse(link)
+        if parsed.scheme not in ("http", "https") or parsed.netloc.lower() != host:
+            continue
+        link = parsed._replace(fragment="", query="").geturl()
+        if CASE_STUDY_LINK_PATTERN.search(parsed.path):
+            case_studies.append(link)
+        if link not in links:
+            links.append(link)
+    
+    team_size = TEAM_SIZE_PATTERN.search(text)
+    
+    return {
+        "technologies": _ordered_labels(TECHNOLOGY_KEYWORDS, technologies),
+        "services": _ordered_labels(SERVICE_KEYWORDS, found["services"]),
+        "target_industries": _ordered_labels(INDUSTRY_KEYWORDS, found["target_industries"]),
+        "case_study_links": sorted(set(case_studies)),
+        "team_size_mentioned": team_size.group(0) if team_size else "",
+        "enterprise_focus": bool(found["enterprise_focus"]),
+        "links": links
+    }
+
+# Per-host politeness: caps concurrent requests and spaces them out
+class HostThrottle:
+    def __init__(self, delay=CRAWL_DELAY, concurrency=CRAWL_HOST_CONCURRENCY):
+        self.delay = delay
+        self.concurrency = concurrency
+        self._lock = threading.Lock()
+        self._hosts = {}
+    
+    @contextmanager
+    def slot(self, host):
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None:
+                state = self._hosts[host] = {"semaphore": threading.BoundedSemaphore(self.concurrency), "next_at": 0.0}
+        
+        with state["semaphore"]:
+            with self._lock:
+                now = time.monotonic()
+                wait = state["next_at"] - now
+                state["next_at"] = max(now, state["next_at"]) + self.delay
+            if wait > 0:
+                time.sleep(wait)
+            yield
+
+# Crawls a few pages per company site over one pooled HTTP session
+class WebsiteCrawler:
+    def __init__(self, cache=None, session=None, delay=CRAWL_DELAY, max_pages=CRAWL_MAX_PAGES, timeout=CRAWL_TIMEOUT):
+        self.cache = cache
+        self.max_pages = max_pages
+        self.timeout = timeout
+        self.throttle = HostThrottle(delay)
+        
+        if session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=CRAWL_POOL_HOSTS,
+                pool_maxsize=CRAWL_HOST_CONCURRENCY,
+                max_retries=urllib3.util.Retry(total=2, backoff_factor=0.5, status_forcelist=[502, 503, 504], allowed_methods=["GET"])
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["User-Agent"] = CRAWL_USER_AGENT
+        self.session = session
+    
+    def crawl(self, url):
+        if not re.match(r"^https?://", url, re.IGNORECASE):
+            url = f"https://{url}"
+        
+        pages = []
+        queue = [url]
+        seen = {url}
+        while queue and len(pages) < self.max_pages:
+            page = self.fetch_page(queue.pop(0))
+            if page is None:
+                if not pages:
+                    return None
+                continue
+            pages.append(page)
+            
+            for hint in CRAWL_LINK_HINTS:
+                for link in page["links"]:
+                    if link not in seen and hint in urlparse(link).path.lower():
+                        seen.add(link)
+                        queue.append(link)
+        
+        return _merge_pages(pages)
+    
+    def fetch_page(self, url):
+        stored = self.cache.get_page(url) if self.cache else None
+        headers = {}
+        if stored and stored["etag"]:
+            headers["If-None-Match"] = stored["etag"]
+        if stored and stored["last_modified"]:
+            headers["If-Modified-Since"] = stored["last_modified"]
+        
+        host = urlparse(url).netloc.lower()
+        try:
+            with self.throttle.slot(host):
+                with self.session.get(url, headers=headers, timeout=self.timeout, stream=True) as response:
+                    if response.status_code == 304 and stored:
+                        return stored["page"]
+                    if response.status_code != 200 or "html" not in response.headers.get("Content-Type", "html"):
+                        return None
+                    page = self._parse(response)
+        except requests.RequestException:
+            return None
+        
+        if self.cache and (response.headers.get("ETag") or response.headers.get("Last-Modified")):
+            self.cache.set_page(url, response.headers.get("ETag"), response.headers.get("Last-Modified"), page)
+        return page
+    
+    def _parse(self, response):
+        parser = PageParser(response.url)
+        charset = "utf-8"
+        if "charset" in response.headers.get("Content-Type", "").lower() and response.encoding:
+            charset = response.encoding
+        decoder = codecs.getincrementaldecoder(charset)(errors="replace")
+        
+        received = 0
+        for chunk in response.iter_content(chunk_size=CRAWL_CHUNK_SIZE):
+            parser.feed(decoder.decode(chunk))
+            received += len(chunk)
+            if received >= CRAWL_MAX_BYTES:
+                break
+        parser.feed(decoder.decode(b"", final=True))
+        parser.close()
+        get_metrics().add_bytes("scrape_company_website", received)
+        
+        # Header names and values carry signatures too (x-hs-hub-id, x-shopid, ...)
+        headers = " ".join(f"{name}: {value}" for name, value in response.headers.items())
+        return _summarize_page(parser, urlparse(response.url).netloc.lower(), headers)
+
+# Function to merge per-page signals into one website_data record
+def _merge_pages(pages):
+    merged = {
+        "technologies": [],
+        "services": [],
+        "target_industries": [],
+        "case_studies": 0,
+        "team_size_mentioned": "",
+        "enterprise_focus": False
+    }
+    case_studies = set()
+    for page in pages:
+        for field in ("technologies", "services", "target_industries"):
+            for value in page[field]:
+                if value not in merged[field]:
+                    merged[field].append(value)
+        case_studies.update(page["case_study_links"])
+        merged["team_size_mentioned"] = merged["team_size_mentioned"] or page["team_size_mentioned"]
+        merged["enterprise_focus"] = merged["enterprise_focus"] or page["enterprise_focus"]
+    merged["case_studies"] = len(case_studies)
+    return merged
+
+# Shared crawler (and its connection pools), kept across Streamlit reruns
+@st.cache_resource
+def get_website_crawler():
+    return WebsiteCrawler(cache=get_enrichment_cache())
+
+# Function to get LinkedIn data
+@instrumented("get_linkedin_data")
+def get_linkedin_data(company_name, linkedin_username=None, linkedin_password=None):
+    store = get_enrichment_store()
+    stored = store.linkedin(company_name) if store else None
+    if stored is not None:
+        return stored
+    
+    cache = get_enrichment_cache()
+    cache_key = normalize_company_name(company_name)
+    cached = cache.get("linkedin", cache_key)
+    if cached is not None:
+        return cached
+    if cache.get("linkedin_missing", cache_key):
+        return None
+    
+    try:
+        linkedin_data = _fetch_linkedin_data(company_name, linkedin_username, linkedin_password)
+    except Exception as e:
+        logger.error("LinkedIn lookup for %s failed: %s", company_name, e)
+        return None
+    _cache_linkedin_data(cache, cache_key, linkedin_data)
+    return linkedin_data
+
+# Function to cache a LinkedIn lookup; companies that weren't found are cached too
+def _cache_linkedin_data(cache, cache_key, linkedin_data):
+    if linkedin_data is None:
+        cache.set("linkedin_missing", cache_key, True)
+    else:
+        cache.set("linkedin", cache_key, linkedin_data)
+
+# Function to get LinkedIn data for several companies at once. Stored and cached
+# companies are answered directly; the rest go to the client manager as one
+# batch, which deduplicates them and shares lookups already in flight.
+@instrumented("get_linkedin_data_batch")
+def get_linkedin_data_batch(company_names, linkedin_username=None, linkedin_password=None):
+    store = get_enrichment_store()
+    cache = get_enrichment_cache()
+    results = {}
+    missing = []
+    for company_name in company_names:
+        cache_key = normalize_company_name(company_name)
+        found = store.linkedin(company_name) if store else None
+        if found is None:
+            found = cache.get("linkedin", cache_key)
+        if found is None and not cache.get("linkedin_missing", cache_key):
+            missing.append(company_name)
+        results[company_name] = found
+    
+    failed = set()
+    if missing and linkedin_username and linkedin_password:
+        logger.info("Retrieving LinkedIn data for %d companies", len(missing))
+        fetched = get_linkedin_manager(linkedin_username, linkedin_password).get_companies(missing, failed=failed, stage="get_linkedin_data_batch")
+    else:
+        fetched = {company_name: _fetch_linkedin_data(company_name) for company_name in missing}
+    
+    for company_name in missing:
+        linkedin_data = fetched[company_name]
+        if company_name not in failed:
+            _cache_linkedin_data(cache, normalize_company_name(company_name), linkedin_data)
+        results[company_name] = linkedin_data
+    return results
+
+def _fetch_linkedin_data(company_name, linkedin_username=None, linkedin_password=None):
+    logger.info("Retrieving LinkedIn data for: %s", company_name)
+    
+    if linkedin_username and linkedin_password:
+        return get_linkedin_manager(linkedin_username, linkedin_password).get_company(company_name)
+    
+    logger.warning("LinkedIn credentials not provided. Using mock data.")
+    
+    # Mock data for demonstration
+    if company_name == "Digital Growth Partners":
+        return {
+            "follower_count": 4500,
+            "employee_count": 78,
+            "year_founded": 2012,
+            "headquarters": "Boston, MA",
+            "specialties": ["Digital Marketing", "CRM", "Marketing Automation"],
+            "recent_posts": 15,
+            "enterprise_clients": ["Acme Corp", "Tech Innovators", "Global Health"],
+            "key_executives": [
+                {"name": "Sarah Johnson", "title": "CEO"},
+                {"name": "Mike Chen", "title": "CTO"},
+                {"name": "Lisa Patel", "title": "VP of Client Services"}
+            ]
+        }
+    elif company_name == "RevOps Solutions Inc.":
+        return {
+            "follower_count": 7200,
+            "employee_count": 122,
+            "year_founded": 2015,
+            "headquarters": "Austin, TX",
+            "specialties": ["Revenue Operations", "CRM Implementation", "Sales Enablement"],
+            "recent_posts": 22,
+            "enterprise_clients": ["Enterprise Software Co.", "Financial Services Inc.", "ManufacturingPro"],
+            "key_executives": [
+                {"name": "Robert Wilson", "title": "CEO"},
+                {"name": "Emily Rodriguez", "title": "COO"},
+                {"name": "David Thompson", "title": "Chief Revenue Officer"}
+            ]
+        }
+    elif company_name == "Enterprise CRM Experts":
+        return {
+            "follower_count": 3800,
+            "employee_count": 67,
+            "year_founded": 2010,
+            "headquarters": "Chicago, IL",
+            "specialties": ["CRM Strategy", "Enterprise Software", "Systems Integration"],
+            "recent_posts": 8,
+            "enterprise_clients": ["Healthcare Solutions", "Global Banking Corp", "Industrial Supplies Inc."],
+            "key_executives": [
+                {"name": "James Anderson", "title": "CEO"},
+                {"name": "Sophia Martinez", "title": "CTO"},
+                {"name": "Michael Lee", "title": "VP of Professional Services"}
+            ]
+        }
+    else:
+        return None
+
+# Token bucket rate limiter shared by every thread using a client
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self, tokens=1):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+# LinkedIn client settings: request pacing and a rolling request budget
+LINKEDIN_REQUESTS_PER_MINUTE = int(os.getenv("LINKEDIN_REQUESTS_PER_MINUTE", "20"))
+LINKEDIN_REQUEST_BUDGET = int(os.getenv("LINKEDIN_REQUEST_BUDGET", "600"))
+LINKEDIN_BUDGET_WINDOW = 24 * 3600
+LINKEDIN_BATCH_SIZE = int(os.getenv("LINKEDIN_BATCH_SIZE", "10"))
+LINKEDIN_EXECUTIVE_TITLES = "CEO OR CTO OR COO OR CRO OR Chief OR President OR VP"
+
+class LinkedInBudgetExceeded(RuntimeError):
+    pass
+
+# Request pacing and rolling budget for one LinkedIn account, kept in SQLite so
+# every process using the account (the app and its background workers) shares
+# one rate and one budget instead of each getting its own
+class SharedRequestLimiter:
+    def __init__(self, path, account, requests_per_minute=LINKEDIN_REQUESTS_PER_MINUTE, budget=LINKEDIN_REQUEST_BUDGET, budget_window=LINKEDIN_BUDGET_WINDOW):
+        self.account = account
+        self.interval = 60.0 / requests_per_minute
+        self.budget = budget
+        self.budget_window = budget_window
+        self._lock = threading.Lock()
+        
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS linkedin_requests (account TEXT NOT NULL, requested_at REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS linkedin_requests_account ON linkedin_requests (account, requested_at);"
+            "CREATE TABLE IF NOT EXISTS linkedin_pacing (account TEXT PRIMARY KEY, next_at REAL NOT NULL);"
+        )
+        self._conn.commit()
+    
+    # Function to reserve the next request slot, sleeping until it comes up.
+    # Raises LinkedInBudgetExceeded once the budget for the window is used up.
+    def acquire(self):
+        with self._lock:
+            now = time.time()
+            # BEGIN IMMEDIATE serializes reservations across processes
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM linkedin_requests WHERE account = ? AND requested_at <= ?", (self.account, now - self.budget_window))
+                (used,) = self._conn.execute("SELECT COUNT(*) FROM linkedin_requests WHERE account = ?", (self.account,)).fetchone()
+                exceeded = used >= self.budget
+                if not exceeded:
+                    row = self._conn.execute("SELECT next_at FROM linkedin_pacing WHERE account = ?", (self.account,)).fetchone()
+                    slot = max(now, row[0] if row else 0.0)
+                    self._conn.execute("INSERT OR REPLACE INTO linkedin_pacing (account, next_at) VALUES (?, ?)", (self.account, slot + self.interval))
+                    self._conn.execute("INSERT INTO linkedin_requests (account, requested_at) VALUES (?, ?)", (self.account, slot))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        
+        if exceeded:
+            raise LinkedInBudgetExceeded(f"LinkedIn request budget of {self.budget} per {self.budget_window}s used up")
+        if slot > now:
+            time.sleep(slot - now)
+
+# One authenticated LinkedIn client per account, shared by every session and thread.
+# Concurrent lookups of the same company share one in-flight request, and
+# every API call goes through a shared rate limiter and request budget: an
+# in-process one by default, or a SharedRequestLimiter across processes.
+class LinkedInClientManager:
+    def __init__(self, username, password, client_factory=None, requests_per_minute=LINKEDIN_REQUESTS_PER_MINUTE, budget=LINKEDIN_REQUEST_BUDGET, budget_window=LINKEDIN_BUDGET_WINDOW, shared_limiter=None):
+        self._client_factory = client_factory or (lambda: linkedin_api.Linkedin(username, password))
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._request_times = deque()
+        self.limiter = TokenBucket(requests_per_minute / 60.0, capacity=max(1, requests_per_minute // 6))
+        self.budget = budget
+        self.budget_window = budget_window
+        self.shared_limiter = shared_limiter
+        self.stats = {"logins": 0, "requests": 0, "lookups": 0, "coalesced": 0}
+    
+    # Logs in on first use only; linkedin_api keeps the session cookies on disk
+    def client(self):
+        with self._client_lock:
+            if self._client is None:
+                self._client = self._client_factory()
+                self.stats["logins"] += 1
+            return self._client
+    
+    def _call(self, stage, method, *args, **kwargs):
+        if self.shared_limiter is not None:
+            self.shared_limiter.acquire()
+            with self._lock:
+                self.stats["requests"] += 1
+        else:
+            with self._lock:
+                now = time.time()
+                while self._request_times and now - self._request_times[0] > self.budget_window:
+                    self._request_times.popleft()
+                if len(self._request_times) >= self.budget:
+                    raise LinkedInBudgetExceeded(f"LinkedIn request budget of {self.budget} per {self.budget_window}s used up")
+                self._request_times.append(now)
+                self.stats["requests"] += 1
+            self.limiter.acquire()
+        
+        result = getattr(self.client(), method)(*args, **kwargs)
+        # The client hands back parsed JSON; its re-encoded size approximates the bytes fetched
+        get_metrics().add_bytes(stage, len(json.dumps(result, default=str)))
+        return result
+    
+    # `stage` names the pipeline stage the fetched bytes are recorded under
+    def get_company(self, company_name, stage="get_linkedin_data"):
+        key = normalize_company_name(company_name)
+        with self._lock:
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+            else:
+                self.stats["coalesced"] += 1
+        
+        if not owner:
+            return future.result()
+        
+        try:
+            result = self._lookup(company_name, stage)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+    
+    # LinkedIn has no bulk company endpoint, so a batch is deduplicated and
+    # fanned out; duplicates and concurrent callers share one lookup. A lookup
+    # that fails (e.g. once the budget is used up) comes back as None, and its
+    # name is added to `failed` when given.
+    def get_companies(self, company_names, max_workers=4, failed=None, stage="get_linkedin_data"):
+        unique = OrderedDict()
+        for name in company_names:
+            unique.setdefault(normalize_company_name(name), name)
+        
+        def lookup(name):
+            try:
+                return self.get_company(name, stage)
+            except Exception as e:
+                logger.error("LinkedIn lookup for %s failed: %s", name, e)
+                if failed is not None:
+                    failed.add(name)
+                return None
+        
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            found = dict(zip(unique, executor.map(lookup, unique.values())))
+        if failed is not None:
+            failed.update(name for name in company_names if unique[normalize_company_name(name)] in failed)
+        return {name: found[normalize_company_name(name)] for name in company_names}
+    
+    def _lookup(self, company_name, stage):
+        with self._lock:
+            self.stats["lookups"] += 1
+        matches = self._call(stage, "search_companies", keywords=[company_name], limit=1)
+        if not matches:
+            return None
+        
+        urn_id = matches[0]["urn_id"]
+        company = self._call(stage, "get_company", urn_id) or {}
+        people = self._call(stage, "search_people", current_company=[urn_id], keyword_title=LINKEDIN_EXECUTIVE_TITLES, limit=10)
+        
+        headquarters = company.get("headquarter") or {}
+        return {
+            "follower_count": (company.get("followingInfo") or {}).get("followerCount", 0),
+            "employee_count": company.get("staffCount", 0),
+            "year_founded": (company.get("foundedOn") or {}).get("year"),
+            "headquarters": ", ".join(part for part in (headquarters.get("city"), headquarters.get("geographicArea")) if part),
+            "specialties": company.get("specialities", []),
+            "recent_posts": 0,
+            "enterprise_clients": [],
+            "key_executives": [{"name": p.get("name"), "title": p.get("jobtitle")} for p in people]
+        }
+
+# Shared LinkedIn client manager per account, kept across Streamlit reruns. Its
+# rate and budget live next to the job queue, so background workers share them.
+@st.cache_resource
+def _shared_linkedin_manager(username, credentials_key, _password):
+    return LinkedInClientManager(username, _password, shared_limiter=SharedRequestLimiter(JOB_QUEUE_PATH, username))
+
+# Function to get the manager for a username and password. The cache is keyed on
+# a hash of both, so a mistyped password doesn't stick to the account.
+def get_linkedin_manager(username, password):
+    credentials_key = hashlib.sha256(f"{username}\0{password}".encode("utf-8")).hexdigest()
+    return _shared_linkedin_manager(username, credentials_key, password)
+
+# Sources a rule check can read from
+RULE_SOURCES = ("company", "website", "linkedin")
+
+# Stands in for a source that hasn't been fetched yet when bounding a score.
+# A builtin singleton, so rule sets cached by an earlier rerun still see
+# the same object
+UNKNOWN = Ellipsis
+
+# Separator used when list fields are joined for exact-membership matching
+LIST_SEPARATOR = "\x1f"
+
+# A single compiled check from the rule file
+class RuleCheck:
+    def __init__(self, kind, source=None, field=None, arg=None, children=()):
+        self.kind = kind
+        self.source = source
+        self.field = field
+        self.arg = arg
+        self.children = children
+        # Checks referenced from several places are memoized per company
+        self.shared = False
+        self.test = self._compile()
+    
+    def _compile(self):
+        children = self.children
+        if self.kind == "all":
+            def test(sources, memo):
+                for child in children:
+                    if not child.evaluate(sources, memo):
+                        return False
+                return True
+            return test
+        if self.kind == "any":
+            def test(sources, memo):
+                for child in children:
+                    if child.evaluate(sources, memo):
+                        return True
+                return False
+            return test
+        
+        index = RULE_SOURCES.index(self.source)
+        field = self.field
+        arg = self.arg
+        
+        if self.kind == "min":
+            def test(sources, memo):
+                data = sources[index]
+                if not data:
+                    return False
+                value = data.get(field)
+                return value is not None and value >= arg
+        elif self.kind == "min_count":
+            def test(sources, memo):
+                data = sources[index]
+                return bool(data) and len(data.get(field) or ()) >= arg
+        elif self.kind == "truthy":
+            def test(sources, memo):
+                data = sources[index]
+                return bool(data) and bool(data.get(field))
+        elif self.kind == "contains_any":
+            search = arg.search
+            text_key = (index, field)
+            def test(sources, memo):
+                text = memo.get(text_key)
+                if text is None:
+                    data = sources[index]
+                    if not data:
+                        return False
+                    value = data.get(field)
+                    # str(list) on purpose: keyword checks have always been
+                    # substring scans over the printed list, and batch
+                    # scoring must agree
+                    text = memo[text_key] = str(value if value is not None else [])
+                return search(text) is not None
+        else:
+            members = arg.members
+            def test(sources, memo):
+                data = sources[index]
+                return bool(data) and not members.isdisjoint(data.get(field) or ())
+        return test
+    
+    # Feature columns this check needs in a batch feature frame
+    def feature_columns(self):
+        if self.children:
+            columns = set()
+            for child in self.children:
+                columns |= child.feature_columns()
+            return columns
+        return {(self.source, self.field, FEATURE_KINDS[self.kind])}
+    
+    # Called once the rule set is compiled: unshared checks skip the memo
+    def bind(self):
+        for child in self.children:
+            child.bind()
+        if not self.shared:
+            self.evaluate = self.test
+    
+    # Three-valued evaluation: True, False, or UNKNOWN when the outcome
+    # depends on a source that is still UNKNOWN
+    def evaluate_partial(self, sources, memo):
+        if self.kind in ("all", "any"):
+            decisive = self.kind == "any"
+            outcome = not decisive
+            for child in self.children:
+                result = child.evaluate_partial(sources, memo)
+                if result is decisive:
+                    return decisive
+                if result is UNKNOWN:
+                    outcome = UNKNOWN
+            return outcome
+        if sources[RULE_SOURCES.index(self.source)] is UNKNOWN:
+            return UNKNOWN
+        return bool(self.test(sources, memo))
+    
+    # sources is a (company_data, website_data, linkedin_data) tuple
+    def evaluate(self, sources, memo):
+        result = memo.get(self)
+        if result is None:
+            result = memo[self] = self.test(sources, memo)
+        return result
+    
+    def evaluate_frame(self, features, memo):
+        result = memo.get(self)
+        if result is not None:
+            return result
+        
+        if self.kind == "all":
+            result = self.children[0].evaluate_frame(features, memo)
+            for child in self.children[1:]:
+                result = result & child.evaluate_frame(features, memo)
+        elif self.kind == "any":
+            result = self.children[0].evaluate_frame(features, memo)
+            for child in self.children[1:]:
+                result = result | child.evaluate_frame(features, memo)
+        else:
+            column = features[_feature_column(self.source, self.field, FEATURE_KINDS[self.kind])]
+            if self.kind == "min":
+                result = pd.to_numeric(column) >= self.arg
+            elif self.kind == "min_count":
+                result = column >= self.arg
+            elif self.kind == "truthy":
+                result = column
+            elif self.kind == "contains_any":
+                result = column.str.contains(self.arg, regex=True)
+            else:
+                result = column.str.contains(self.arg.joined_pattern, regex=True)
+            result = features[f"{self.source}:present"] & result.fillna(False).astype(bool)
+        
+        memo[self] = result
+        return result
+    
+    # evaluate_partial over a feature frame, treating sources that aren't
+    # present as UNKNOWN; returns (known true, unknown) boolean arrays
+    def evaluate_frame_partial(self, features, memo):
+        if self.kind in ("all", "any"):
+            results = [child.evaluate_frame_partial(features, memo) for child in self.children]
+            hits = np.array([hit for hit, _ in results])
+            unknown = np.array([unsure for _, unsure in results])
+            if self.kind == "any":
+                hit = hits.any(axis=0)
+                return hit, ~hit & unknown.any(axis=0)
+            hit = hits.all(axis=0)
+            missed = (~hits & ~unknown).any(axis=0)
+            return hit, ~hit & ~missed
+        
+        hit = self.evaluate_frame(features, memo).to_numpy(dtype=bool)
+        if self.source == "company":
+            return hit, np.zeros(len(hit), dtype=bool)
+        return hit, ~features[f"{self.source}:present"].to_numpy(dtype=bool)
+
+# Function to group identical rows of a 2-D array; returns (index of each
+# distinct row's first occurrence, distinct row number of every row). Rows are
+# compared as raw bytes, which is much faster than np.unique(axis=0).
+def _distinct_rows(matrix):
+    matrix = np.ascontiguousarray(matrix)
+    keys = matrix.view(np.dtype((np.void, matrix.dtype.itemsize * matrix.shape[1]))).ravel() if matrix.shape[1] else np.zeros(len(matrix), dtype=np.int8)
+    _, first, codes = np.unique(keys, return_index=True, return_inverse=True)
+    return first, codes.ravel()
+
+# Exact-membership keyword set, with a pattern for joined list columns
+class MemberSet:
+    def __init__(self, members):
+        self.members = frozenset(members)
+        separator = re.escape(LIST_SEPARATOR)
+        alternation = "|".join(re.escape(m) for m in sorted(self.members))
+        self.joined_pattern = re.compile(f"(?:^|{separator})(?:{alternation})(?:{separator}|$)")
+
+# How each leaf check reads its field: the feature kind it is evaluated on
+FEATURE_KINDS = {
+    "min": "value",
+    "min_count": "count",
+    "truthy": "truthy",
+    "contains_any": "text",
+    "any_member": "items"
+}
+
+# Function to extract one feature from a source dict (scalar path)
+def _feature_value(data, field, feature_kind):
+    value = data.get(field)
+    if feature_kind == "value":
+        return value
+    if feature_kind == "truthy":
+        return bool(value)
+    if feature_kind == "text":
+        return str(value if value is not None else [])
+    if feature_kind == "count":
+        return len(value or [])
+    return value or []
+
+def _feature_column(source, field, feature_kind):
+    return f"{source}.{field}:{feature_kind}"
+
+# Function to compile one check definition from the rule file
+def _compile_check(spec, named_checks, definitions):
+    if isinstance(spec, str):
+        if spec not in named_checks:
+            if spec not in definitions:
+                raise ValueError(f"Unknown check '{spec}' in IPP rules")
+            named_checks[spec] = _compile_check(definitions[spec], named_checks, definitions)
+            named_checks[spec].shared = True
+        return named_checks[spec]
+    
+    for kind in ("all", "any"):
+        if kind in spec:
+            children = tuple(_compile_check(child, named_checks, definitions) for child in spec[kind])
+            if not children:
+                raise ValueError(f"Empty '{kind}' check in IPP rules")
+            return RuleCheck(kind, children=children)
+    
+    source = spec.get("source")
+    if source not in RULE_SOURCES:
+        raise ValueError(f"Check source must be one of {', '.join(RULE_SOURCES)}, got {source!r}")
+    
+    if "min" in spec:
+        return RuleCheck("min", source, spec["field"], spec["min"])
+    if "min_count" in spec:
+        return RuleCheck("min_count", source, spec["field"], spec["min_count"])
+    if spec.get("truthy"):
+        return RuleCheck("truthy", source, spec["field"])
+    if "contains_any" in spec:
+        pattern = re.compile("|".join(re.escape(k) for k in spec["contains_any"]))
+        return RuleCheck("contains_any", source, spec["field"], pattern)
+    if "any_member" in spec:
+        return RuleCheck("any_member", source, spec["field"], MemberSet(spec["any_member"]))
+    raise ValueError(f"Unrecognized check in IPP rules: {spec}")
+
+# Compiled IPP rule set: scores companies and generates recommendations
+class IppRules:
+    def __init__(self, definition, version=""):
+        self.version = version
+        self.categories = []
+        self.criteria = {}
+        
+        definitions = definition.get("checks", {})
+        named_checks = {}
+        for name in definitions:
+            _compile_check(name, named_checks, definitions)
+        
+        for category in definition["categories"]:
+            rules = []
+            rule_checks = {}
+            for rule in category["rules"]:
+                check = _compile_check(rule["check"], named_checks, definitions)
+                rule_checks[rule["id"]] = check
+                rules.append({
+                    "id": rule["id"],
+                    "points": rule.get("points", 1),
+                    "exclusive": rule.get("exclusive"),
+                    "label": rule.get("label"),
+                    "check": check
+                })
+            
+            recommendations = []
+            for rec in category.get("recommendations", []):
+                unless = rec.get("unless")
+                if isinstance(unless, str) and unless in rule_checks:
+                    unless = rule_checks[unless]
+                    unless.shared = True
+                elif unless is not None:
+                    unless = _compile_check(unless, named_checks, definitions)
+                recommendations.append({
+                    "unless": unless,
+                    "text": rec.get("text"),
+                    "missing_labels": rec.get("missing_labels")
+                })
+            
+            self.categories.append({
+                "name": category["name"],
+                "compiled_rules": [(r["check"], r["points"], r["exclusive"], r["label"]) for r in rules],
+                "max_score": category["max_score"],
+                "recommend_below": category.get("recommend_below", 75),
+                "rules": rules,
+                "labels": [rule["label"] for rule in rules if rule["label"]],
+                "recommendations": recommendations
+            })
+            self.criteria[category["name"]] = category.get("criteria", [])
+        
+        self.max_scores = {c["name"]: c["max_score"] for c in self.categories}
+        self.max_total = sum(self.max_scores.values())
+        self.labels = [label for c in self.categories for label in c["labels"]]
+        
+        self.feature_columns = set()
+        for category in self.categories:
+            for rule in category["rules"]:
+                rule["check"].bind()
+                self.feature_columns |= rule["check"].feature_columns()
+            for rec in category["recommendations"]:
+                if rec["unless"] is not None:
+                    rec["unless"].bind()
+                    self.feature_columns |= rec["unless"].feature_columns()
+        self.feature_columns = sorted(self.feature_columns)
+        self.feature_column_names = [f"{source}:present" for source in RULE_SOURCES] + [_feature_column(*column) for column in self.feature_columns]
+    
+    def score(self, company_data, website_data, linkedin_data, memo=None):
+        sources = (company_data, website_data, linkedin_data)
+        memo = {} if memo is None else memo
+        
+        score = {}
+        specializations = []
+        for category in self.categories:
+            total = 0
+            taken = None
+            for check, points, exclusive, label in category["compiled_rules"]:
+                if exclusive and taken and exclusive in taken:
+                    continue
+                if check.evaluate(sources, memo):
+                    total += points
+                    if exclusive:
+                        taken = (taken or set()) | {exclusive}
+                    if label:
+                        specializations.append(label)
+            score[category["name"]] = min(total, category["max_score"])
+        
+        percentage_scores = {}
+        for category, value in score.items():
+            percentage_scores[category] = (value / self.max_scores[category]) * 100
+        
+        overall_match = (sum(score.values()) / self.max_total) * 100
+        
+        return {
+            "detailed_scores": score,
+            "percentage_scores": percentage_scores,
+            "overall_match": overall_match,
+            "specializations": specializations
+        }
+    
+    # Lowest and highest overall match still reachable while some sources are
+    # UNKNOWN; both equal score()'s overall_match once every source is known
+    def bounds(self, company_data, website_data=UNKNOWN, linkedin_data=UNKNOWN):
+        sources = (company_data, website_data, linkedin_data)
+        memo = {}
+        
+        lower_total = upper_total = 0
+        for category in self.categories:
+            lower = upper = 0
+            groups = {}
+            for check, points, exclusive, label in category["compiled_rules"]:
+                result = check.evaluate_partial(sources, memo)
+                if result is False:
+                    continue
+                if not exclusive:
+                    upper += points
+                    if result is True:
+                        lower += points
+                    continue
+                
+                # Only the first rule that hits in an exclusive group scores,
+                # so an undecided rule ahead of a sure hit may still take its place
+                group = groups.setdefault(exclusive, {"settled": False, "low": points, "high": 0})
+                if group["settled"]:
+                    continue
+                group["low"] = min(group["low"], points)
+                group["high"] = max(group["high"], points)
+                group["settled"] = result is True
+            
+            for group in groups.values():
+                upper += group["high"]
+                if group["settled"]:
+                    lower += group["low"]
+            lower_total += min(lower, category["max_score"])
+            upper_total += min(upper, category["max_score"])
+        
+        return (lower_total / self.max_total) * 100, (upper_total / self.max_total) * 100
+    
+    def recommend(self, company_data, score_data, website_data, linkedin_data, memo=None):
+        sources = (company_data, website_data, linkedin_data)
+        memo = {} if memo is None else memo
+        
+        recommendations = []
+        for category in self.categories:
+            if score_data["percentage_scores"][category["name"]] >= category["recommend_below"]:
+                continue
+            
+            for rec in category["recommendations"]:
+                if rec["missing_labels"]:
+                    have = score_data.get("specializations", [])
+                    missing = [label for label in category["labels"] if label not in have]
+                    if missing:
+                        recommendations.append(rec["missing_labels"].format(labels=", ".join(missing)))
+                elif rec["unless"] is None or not rec["unless"].evaluate(sources, memo):
+                    recommendations.append(rec["text"])
+        
+        return recommendations
+    
+    # Scores and recommends in one pass, evaluating every check at most once
+    def evaluate(self, company_data, website_data, linkedin_data):
+        memo = {}
+        score_data = self.score(company_data, website_data, linkedin_data, memo)
+        recommendations = self.recommend(company_data, score_data, website_data, linkedin_data, memo)
+        return score_data, recommendations
+    
+    def build_feature_frame(self, records):
+        # Built a column at a time, so each column is one comprehension over
+        # the records rather than a dict lookup per row and column
+        records = records if isinstance(records, list) else list(records)
+        sources = {source: [record[i] for record in records] for i, source in enumerate(RULE_SOURCES)}
+        
+        columns = {}
+        for source, data in sources.items():
+            columns[f"{source}:present"] = [bool(d) for d in data]
+        
+        # Same values as _feature_value, inlined per kind
+        for source, field, feature_kind in self.feature_columns:
+            data = sources[source]
+            if feature_kind == "value":
+                values = [d.get(field) if d else None for d in data]
+            elif feature_kind == "truthy":
+                values = [bool(d.get(field)) if d else None for d in data]
+            elif feature_kind == "count":
+                values = [len(d.get(field) or []) if d else None for d in data]
+            elif feature_kind == "text":
+                values = [_feature_value(d, field, feature_kind) if d else "" for d in data]
+            else:
+                values = [LIST_SEPARATOR.join(d.get(field) or []) if d else "" for d in data]
+            columns[_feature_column(source, field, feature_kind)] = values
+        
+        return pd.DataFrame(columns)
+    
+    # Recommendations for every row of a feature frame and its score frame;
+    # the same lists recommend() returns row by row. Rows with the same
+    # outcome share one (read-only) list.
+    def recommend_frame(self, features, scores, memo=None):
+        memo = {} if memo is None else memo
+        rows = len(features)
+        labels = list(dict.fromkeys(self.labels))
+        hits = scores[labels].to_numpy(dtype=bool) if labels else np.zeros((rows, 0), dtype=bool)
+        
+        # One column per recommendation: whether it applies to the row
+        applies = []
+        for category in self.categories:
+            below = (scores[f"{category['name']} %"] < category["recommend_below"]).to_numpy()
+            for rec in category["recommendations"]:
+                if rec["missing_labels"]:
+                    have = scores[category["labels"]].to_numpy(dtype=bool) if category["labels"] else np.ones((rows, 1), dtype=bool)
+                    applies.append(below & ~have.all(axis=1))
+                elif rec["unless"] is not None:
+                    applies.append(below & ~rec["unless"].evaluate_frame(features, memo).to_numpy(dtype=bool))
+                else:
+                    applies.append(below)
+        
+        outcomes = np.hstack([np.column_stack(applies) if applies else np.zeros((rows, 0), dtype=bool), hits])
+        first, codes = _distinct_rows(outcomes)
+        
+        shared = []
+        for row in first.tolist():
+            row_applies = iter(outcomes[row].tolist())
+            have = {label for label, hit in zip(labels, hits[row].tolist()) if hit}
+            recommendations = []
+            for category in self.categories:
+                for rec in category["recommendations"]:
+                    if not next(row_applies):
+                        continue
+                    if rec["missing_labels"]:
+                        missing = [label for label in category["labels"] if label not in have]
+                        recommendations.append(rec["missing_labels"].format(labels=", ".join(missing)))
+                    else:
+                        recommendations.append(rec["text"])
+            shared.append(recommendations)
+        
+        return [shared[code] for code in codes.tolist()]
+    
+    # bounds() for every row of a feature frame, with the website and LinkedIn
+    # sources UNKNOWN where they aren't present; returns (lower, upper) arrays
+    def bounds_frame(self, features, memo=None):
+        memo = {} if memo is None else memo
+        rows = len(features)
+        lower_total = np.zeros(rows, dtype=np.int64)
+        upper_total = np.zeros(rows, dtype=np.int64)
+        for category in self.categories:
+            lower = np.zeros(rows, dtype=np.int64)
+            upper = np.zeros(rows, dtype=np.int64)
+            groups = {}
+            for rule in category["rules"]:
+                hit, unknown = rule["check"].evaluate_frame_partial(features, memo)
+                possible = hit | unknown
+                points = rule["points"]
+                if not rule["exclusive"]:
+                    upper += possible * points
+                    lower += hit * points
+                    continue
+                
+                # Same exclusive-group rule as bounds(), row by row
+                settled, low, high = groups.get(rule["exclusive"], (np.zeros(rows, dtype=bool), np.full(rows, np.iinfo(np.int64).max), np.zeros(rows, dtype=np.int64)))
+                active = possible & ~settled
+                low = np.where(active, np.minimum(low, points), low)
+                high = np.where(active, np.maximum(high, points), high)
+                groups[rule["exclusive"]] = (settled | (active & hit), low, high)
+            
+            for settled, low, high in groups.values():
+                upper += high
+                lower += np.where(settled, low, 0)
+            lower_total += np.minimum(lower, category["max_score"])
+            upper_total += np.minimum(upper, category["max_score"])
+        
+        return (lower_total / self.max_total) * 100, (upper_total / self.max_total) * 100
+    
+    def score_frame(self, features, memo=None):
+        memo = {} if memo is None else memo
+        scores = pd.DataFrame(index=features.index)
+        
+        total = 0
+        for category in self.categories:
+            category_total = pd.Series(0, index=features.index)
+            taken = {}
+            for rule in category["rules"]:
+                hit = rule["check"].evaluate_frame(features, memo)
+                if rule["exclusive"]:
+                    prior = taken.get(rule["exclusive"])
+                    if prior is not None:
+                        hit = hit & ~prior
+                        taken[rule["exclusive"]] = prior | hit
+                    else:
+                        taken[rule["exclusive"]] = hit
+                if rule["label"]:
+                    scores[rule["label"]] = hit
+                category_total = category_total + hit.astype(int) * rule["points"]
+            
+            name = category["name"]
+            scores[name] = category_total.clip(upper=category["max_score"]).astype(int)
+            scores[f"{name} %"] = (scores[name] / category["max_score"]) * 100
+            total = total + scores[name]
+        
+        scores["overall_match"] = (total / self.max_total) * 100
+        return scores
+
+# Location of the IPP scoring rules (criteria, weights, checks and recommendations)
+IPP_RULES_PATH = os.getenv("IPP_RULES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ipp_rules.json"))
+
+# Function to load and compile an IPP rule file
+def load_ipp_rules(path=IPP_RULES_PATH):
+    with open(path, "rb") as f:
+        raw = f.read()
+    return IppRules(json.loads(raw), version=hashlib.sha1(raw).hexdigest()[:12])
+
+@st.cache_resource
+def _load_shared_ipp_rules(path, mtime):
+    return load_ipp_rules(path)
+
+_ipp_rules = None
+
+# Compiled rules, shared across reruns and reloaded when the rule file changes on restart
+def get_ipp_rules():
+    global _ipp_rules
+    if _ipp_rules is None:
+        _ipp_rules = _load_shared_ipp_rules(IPP_RULES_PATH, os.path.getmtime(IPP_RULES_PATH))
+    return _ipp_rules
+
+# Function to score a company based on IPP criteria
+@instrumented("score_company")
+def score_company(company_data, website_data, linkedin_data):
+    return get_ipp_rules().score(company_data, website_data, linkedin_data)
+
+# Function to generate recommendations
+@instrumented("generate_recommendations")
+def generate_recommendations(company_data, score_data, website_data, linkedin_data):
+    return get_ipp_rules().recommend(company_data, score_data, website_data, linkedin_data)
+
+# Function to score a company and generate its recommendations in one pass
+@instrumented("evaluate_company")
+def evaluate_company(company_data, website_data, linkedin_data):
+    return get_ipp_rules().evaluate(company_data, website_data, linkedin_data)
+
+# Function to bound a company's overall match before all of its data is fetched
+def score_bounds(company_data, website_data=UNKNOWN, linkedin_data=UNKNOWN):
+    return get_ipp_rules().bounds(company_data, website_data, linkedin_data)
+
+# Function to bound every row of a feature frame (missing website or LinkedIn data counts as unknown)
+def score_bounds_frame(features, memo=None):
+    return get_ipp_rules().bounds_frame(features, memo)
+
+# Function to turn enriched companies into a columnar feature frame
+def build_feature_frame(records):
+    # records is an iterable of (company_data, website_data, linkedin_data)
+    return get_ipp_rules().build_feature_frame(records)
+
+# Function to score every row of a feature frame at once
+def score_feature_frame(features, memo=None):
+    return get_ipp_rules().score_frame(features, memo)
+
+# Function to score many companies at once (same results as score_company)
+@instrumented("score_companies")
+def score_companies(records):
+    return score_feature_frame(build_feature_frame(records))
+
+# Function to generate recommendations for every row of a scored feature frame
+def recommend_feature_frame(features, scores, memo=None):
+    return get_ipp_rules().recommend_frame(features, scores, memo)
+
+# Function to score every row of a feature frame and generate its
+# recommendations; returns (score_company-style dicts, recommendation lists)
+def evaluate_feature_frame(features):
+    # Checks shared by scoring and recommendations are evaluated once
+    memo = {}
+    scores = score_feature_frame(features, memo)
+    return score_frame_to_dicts(scores), recommend_feature_frame(features, scores, memo)
+
+# Function to score many companies and generate their recommendations in one pass
+@instrumented("evaluate_companies")
+def evaluate_companies(records):
+    return evaluate_feature_frame(build_feature_frame(records))
+
+# Function to convert a batch score frame back into score_company-style dicts
+def score_frame_to_dicts(scores):
+    rules = get_ipp_rules()
+    categories = list(rules.max_scores)
+    
+    # Rows share few combinations of category scores and labels, so each
+    # distinct combination's dicts are built once and shared, read-only, by
+    # every row that has it
+    detailed = scores[categories].to_numpy(dtype=np.int64)
+    hits = scores[rules.labels].to_numpy(dtype=np.int64) if rules.labels else np.zeros((len(scores), 0), dtype=np.int64)
+    first, codes = _distinct_rows(np.hstack([detailed, hits]))
+    
+    percentages = scores[[f"{category} %" for category in categories]].to_numpy(dtype=float)
+    shared = []
+    for row in first.tolist():
+        shared.append((
+            dict(zip(categories, detailed[row].tolist())),
+            dict(zip(categories, percentages[row].tolist())),
+            [label for label, hit in zip(rules.labels, hits[row].tolist()) if hit]
+        ))
+    
+    results = []
+    for code, overall_match in zip(codes.tolist(), scores["overall_match"].astype(float).tolist()):
+        detailed_scores, percentage_scores, specializations = shared[code]
+        results.append({
+            "detailed_scores": detailed_scores,
+            "percentage_scores": percentage_scores,
+            "overall_match": overall_match,
+            "specializations": specializations
+        })
+    return results
+
+# Function to fingerprint a company's inputs. The rules version is kept next
+# to it (criteria_version), so a criteria change is spotted without hashing
+# every company again.
+def fingerprint_inputs(company, website_data, linkedin_data):
+    payload = json.dumps([company, website_data, linkedin_data], sort_keys=True, default=_json_default)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+# Function to check whether an analysis is still valid for the given inputs under the current rules
+def is_current(entry, fingerprint):
+    return entry.get("criteria_version") == get_ipp_rules().version and entry.get("fingerprint") == fingerprint
+
+# Function to build the analysis record for a single company
+def build_analysis(company, website_data, linkedin_data, score_data=None, previous=None, fingerprint=None, skipped=(), recommendations=None):
+    # Unchanged inputs under the same criteria: keep the previous result
+    fingerprint = fingerprint or fingerprint_inputs(company, website_data, linkedin_data)
+    if previous and is_current(previous, fingerprint):
+        return previous
+    
+    if score_data is None:
+        score_data, recommendations = evaluate_company(company, website_data, linkedin_data)
+    elif recommendations is None:
+        recommendations = generate_recommendations(company, score_data, website_data, linkedin_data)
+    
+    entry = {
+        "company": company,
+        "website_data": website_data,
+        "linkedin_data": linkedin_data,
+        "score_data": score_data,
+        "recommendations": recommendations,
+        "fingerprint": fingerprint,
+        "criteria_version": get_ipp_rules().version
+    }
+    
+    # Lookups that came back empty (or were skipped) don't sink the analysis:
+    # the score counts only what is known and is marked provisional, along
+    # with the best case it could still reach
+    missing = [source for source, data in (("website", website_data), ("linkedin", linkedin_data)) if not data and source not in skipped]
+    entry["missing_sources"] = missing
+    entry["skipped_sources"] = list(skipped)
+    entry["provisional"] = bool(missing or skipped)
+    if entry["provisional"]:
+        entry["score_range"] = score_bounds(company, website_data or UNKNOWN, linkedin_data or UNKNOWN)
+    return entry
+
+# Share of the ranking a batch of changes can reach before the ranking is
+# rebuilt with one sort instead of updated entry by entry
+RANKING_REBUILD_FRACTION = 0.03
+
+# Ranking of analyzed companies by overall match, kept sorted as entries change
+class PartnerRanking:
+    def __init__(self, analysis=None):
+        # Built with one sort; insorting entry by entry shifts the list every time
+        self._scores = {name: entry["score_data"]["overall_match"] for name, entry in (analysis or {}).items()}
+        self._keys = sorted((-score, name) for name, score in self._scores.items())
+    
+    # Binary search to find the slot; replacing a score moves one entry
+    # instead of re-sorting the whole list
+    def update(self, name, overall_match):
+        old = self._scores.get(name)
+        if old == overall_match:
+            return
+        if old is not None:
+            del self._keys[bisect_left(self._keys, (-old, name))]
+        insort(self._keys, (-overall_match, name))
+        self._scores[name] = overall_match
+    
+    # Function to apply many score changes; a batch bigger than
+    # RANKING_REBUILD_FRACTION of the ranking is cheaper to re-sort than to
+    # move entry by entry
+    def update_many(self, scores):
+        if len(scores) <= len(self._keys) * RANKING_REBUILD_FRACTION:
+            for name, overall_match in scores.items():
+                self.update(name, overall_match)
+            return
+        self._scores.update(scores)
+        self._keys = sorted((-score, name) for name, score in self._scores.items())
+    
+    def remove(self, name):
+        old = self._scores.pop(name, None)
+        if old is not None:
+            del self._keys[bisect_left(self._keys, (-old, name))]
+    
+    def names(self, start=0, stop=None):
+        return [name for _, name in self._keys[start:stop]]
+    
+    def __len__(self):
+        return len(self._keys)
+
+# Size of the streaming top-K ranking
+TOP_K_DEFAULT = 50
 
-# Function to search for companies
-def search_companies(query, location=None, industry=None, api_key=None):
-    st.write(f"Searching for companies matching: {query}")
+# Heap entry ordered so the root is the weakest partner (lowest score, then last by name)
+class _RankedEntry:
+    __slots__ = ("score", "name", "analysis")
     
-    # This would typically use a real API like LinkedIn or Clearbit
-    # For demonstration, returning mock data
-    if not api_key:
-        st.warning("API key not provided. Using mock data.")
-        
-    # In a real implementation, this would make API calls
-    # Mock data for demonstration
-    mock_results = [
-        {
-            "name": "Digital Growth Partners",
-            "website": "digitalgrowthpartners.com",
-            "employees": 75,
-            "location": "Boston, MA",
-            "industry": "Digital Marketing",
-            "description": "Full-service digital marketing agency specializing in SEO, PPC, and CRM implementation",
-            "founded": 2012,
-            "specializations": ["Digital Marketing", "CRM Implementation", "Content Marketing"]
-        },
-        {
-            "name": "RevOps Solutions Inc.",
-            "website": "revopssolutions.com",
-            "employees": 120,
-            "location": "Austin, TX",
-            "industry": "Business Consulting",
-            "description": "Revenue Operations consultancy helping enterprise businesses align sales, marketing and customer service",
-            "founded": 2015,
-            "specializations": ["RevOps", "CRM Implementation", "Marketing Automation"]
-        },
-        {
-            "name": "Enterprise CRM Experts",
-            "website": "enterprisecrm.co",
-            "employees": 65,
-            "location": "Chicago, IL",
-            "industry": "Technology Consulting",
-            "description": "CRM implementation specialists for mid-market and enterprise companies",
-            "founded": 2010,
-            "specializations": ["CRM Implementation", "Systems Integration", "Custom Development"]
-        }
-    ]
+    def __init__(self, score, name, analysis):
+        self.score = score
+        self.name = name
+        self.analysis = analysis
     
-    return mock_results
+    def __lt__(self, other):
+        return self.score < other.score or (self.score == other.score and self.name > other.name)
 
-# Function to scrape company website
-def scrape_company_website(url):
-    st.write(f"Analyzing website: {url}")
+# Bounded min-heap holding the best k analyses seen so far
+class TopKRanking:
+    def __init__(self, k=TOP_K_DEFAULT):
+        self.k = k
+        self._heap = []
     
-    try:
-        # In a real implementation, this would make actual requests
-        # Mock data for demonstration
-        if "digitalgrowthpartners" in url:
-            return {
-                "technologies": ["Salesforce", "Marketo", "Google Analytics", "WordPress"],
-                "services": ["SEO", "PPC", "Content Marketing", "Email Marketing", "CRM Implementation"],
-                "target_industries": ["SaaS", "Healthcare", "Finance"],
-                "case_studies": 12,
-                "team_size_mentioned": "70+ professionals",
-                "enterprise_focus": True
-            }
-        elif "revopssolutions" in url:
-            return {
-                "technologies": ["HubSpot", "Salesforce", "Tableau", "Zapier"],
-                "services": ["RevOps Consulting", "CRM Implementation", "Sales Enablement", "Marketing Automation"],
-                "target_industries": ["Technology", "Manufacturing", "Professional Services"],
-                "case_studies": 8,
-                "team_size_mentioned": "Over 100 consultants",
-                "enterprise_focus": True
-            }
-        elif "enterprisecrm" in url:
-            return {
-                "technologies": ["Salesforce", "Microsoft Dynamics", "Oracle", "SAP"],
-                "services": ["CRM Strategy", "Implementation", "Training", "Support"],
-                "target_industries": ["Healthcare", "Financial Services", "Manufacturing"],
-                "case_studies": 15,
-                "team_size_mentioned": "60+ specialists",
-                "enterprise_focus": True
-            }
-        else:
-            return {
-                "technologies": [],
-                "services": [],
-                "target_industries": [],
-                "case_studies": 0,
-                "team_size_mentioned": "",
-                "enterprise_focus": False
-            }
-    except Exception as e:
-        st.error(f"Error scraping website: {e}")
-        return None
+    # Score a company must beat to get in, or None while there's room
+    def threshold(self):
+        return self._heap[0].score if len(self._heap) >= self.k else None
+    
+    def could_enter(self, upper_bound):
+        threshold = self.threshold()
+        return threshold is None or upper_bound >= threshold
+    
+    def offer(self, name, overall_match, analysis):
+        entry = _RankedEntry(overall_match, name, analysis)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+            return True
+        if self._heap[0] < entry:
+            heapq.heapreplace(self._heap, entry)
+            return True
+        return False
+    
+    # Analyses best first, in the same order as PartnerRanking
+    def analyses(self):
+        return {entry.name: entry.analysis for entry in sorted(self._heap, reverse=True)}
+    
+    def __len__(self):
+        return len(self._heap)
 
-# Function to get LinkedIn data
-def get_linkedin_data(company_name, linkedin_username=None, linkedin_password=None):
-    st.write(f"Retrieving LinkedIn data for: {company_name}")
+# Function to find the k best partners, skipping lookups for companies that can't make the cut
+def top_partners(companies, k=TOP_K_DEFAULT, linkedin_username=None, linkedin_password=None, max_workers=DEFAULT_MAX_WORKERS, previous=None):
+    # Every company gets an upper bound on its overall match from the search
+    # fields alone, and candidates are enriched best bound first. Once the
+    # heap is full, a company whose bound is below the k-th best score is
+    # never looked up, and since bounds only fall from there on, the rest
+    # of the list is dropped with it. The website is fetched first; LinkedIn
+    # (rate limited and budgeted) only if the tightened bound can still
+    # reach the top k and isn't already exact. Empty lookups leave a
+    # provisional score that competes like any other.
+    previous = previous or {}
+    max_workers = max(1, max_workers)
+    ranking = TopKRanking(k)
+    stats = {"candidates": 0, "enriched": 0, "pruned": 0, "failed": 0}
+    # Companies with at least one failed lookup, each counted once
+    failed = set()
     
-    if not linkedin_username or not linkedin_password:
-        st.warning("LinkedIn credentials not provided. Using mock data.")
+    candidates = {}
+    for company in companies:
+        candidates.setdefault(company['name'], company)
+    stats["candidates"] = len(candidates)
+    candidates = iter(sorted(((score_bounds(company)[1], company) for company in candidates.values()), key=lambda c: -c[0]))
     
-    # In a real implementation, this would use the LinkedIn API
-    # Mock data for demonstration
-    if company_name == "Digital Growth Partners":
-        return {
-            "follower_count": 4500,
-            "employee_count": 78,
-            "year_founded": 2012,
-            "headquarters": "Boston, MA",
-            "specialties": ["Digital Marketing", "CRM", "Marketing Automation"],
-            "recent_posts": 15,
-            "enterprise_clients": ["Acme Corp", "Tech Innovators", "Global Health"],
-            "key_executives": [
-                {"name": "Sarah Johnson", "title": "CEO"},
-                {"name": "Mike Chen", "title": "CTO"},
-                {"name": "Lisa Patel", "title": "VP of Client Services"}
-            ]
-        }
-    elif company_name == "RevOps Solutions Inc.":
-        return {
-            "follower_count": 7200,
-            "employee_count": 122,
-            "year_founded": 2015,
-            "headquarters": "Austin, TX",
-            "specialties": ["Revenue Operations", "CRM Implementation", "Sales Enablement"],
-            "recent_posts": 22,
-            "enterprise_clients": ["Enterprise Software Co.", "Financial Services Inc.", "ManufacturingPro"],
-            "key_executives": [
-                {"name": "Robert Wilson", "title": "CEO"},
-                {"name": "Emily Rodriguez", "title": "COO"},
-                {"name": "David Thompson", "title": "Chief Revenue Officer"}
-            ]
-        }
-    elif company_name == "Enterprise CRM Experts":
-        return {
-            "follower_count": 3800,
-            "employee_count": 67,
-            "year_founded": 2010,
-            "headquarters": "Chicago, IL",
-            "specialties": ["CRM Strategy", "Enterprise Software", "Systems Integration"],
-            "recent_posts": 8,
-            "enterprise_clients": ["Healthcare Solutions", "Global Banking Corp", "Industrial Supplies Inc."],
-            "key_executives": [
-                {"name": "James Anderson", "title": "CEO"},
-                {"name": "Sophia Martinez", "title": "CTO"},
-                {"name": "Michael Lee", "title": "VP of Professional Services"}
-            ]
-        }
-    else:
-        return None
+    ctx = get_script_run_ctx(suppress_warning=True)
+    
+    def attach_ctx():
+        if ctx is not None:
+            add_script_run_ctx(ctx=ctx)
+    
+    futures = {}
+    
+    with ThreadPoolExecutor(max_workers=max_workers, initializer=attach_ctx) as executor:
+        def submit_more():
+            while len(futures) < max_workers:
+                upper, company = next(candidates, (None, None))
+                if company is None:
+                    return
+                if not ranking.could_enter(upper):
+                    stats["pruned"] += 1 + sum(1 for _ in candidates)
+                    return
+                futures[executor.submit(scrape_company_website, company['website'])] = (company, "website_data", None)
+        
+        submit_more()
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                company, stage, website_data = futures.pop(future)
+                name = company['name']
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error("Lookup for %s failed: %s", name, e)
+                    result = None
+                
+                if not result:
+                    failed.add(name)
+                
+                if stage == "website_data":
+                    lower, upper = score_bounds(company, result or None)
+                    if not ranking.could_enter(upper):
+                        stats["pruned"] += 1
+                        continue
+                    if lower < upper:
+                        futures[executor.submit(get_linkedin_data, name, linkedin_username, linkedin_password)] = (company, "linkedin_data", result)
+                        continue
+                    website_data, linkedin_data, skipped = result, None, ("linkedin",)
+                else:
+                    linkedin_data, skipped = result, ()
+                
+                stats["enriched"] += 1
+                analysis = build_analysis(company, website_data, linkedin_data, previous=previous.get(name), skipped=skipped)
+                ranking.offer(name, analysis["score_data"]["overall_match"], analysis)
+            
+            submit_more()
+    
+    stats["failed"] = len(failed)
+    return ranking.analyses(), stats
 
-# Function to score a company based on IPP criteria
-def score_company(company_data, website_data, linkedin_data):
-    score = {
-        "Company Profile": 0,
-        "Customer Focus": 0,
-        "Tech Stack Expertise": 0,
-        "Strategic Alignment": 0,
-        "Specializations": 0
-    }
+# Companies scored together in one vectorized pass while streaming results
+ANALYSIS_BATCH_SIZE = 500
+
+# Batch analysis skips the LinkedIn lookup for companies whose best possible
+# overall match (%) is below this, once their website is known
+ENRICHMENT_FIT_THRESHOLD = float(os.getenv("ENRICHMENT_FIT_THRESHOLD", "50"))
+
+# Function to decide whether a LinkedIn lookup could still change a company's result
+def needs_linkedin(company, website_data, fit_threshold=ENRICHMENT_FIT_THRESHOLD):
+    lower, upper = score_bounds(company, website_data or None)
+    # Equal bounds: LinkedIn can't move any category score
+    return lower < upper and upper >= fit_threshold
+
+# Function to score a batch of enriched companies, reusing unchanged results
+def _score_enriched(enriched, previous):
+    results = []
+    changed = []
+    for company, website_data, linkedin_data, skipped in enriched:
+        fingerprint = fingerprint_inputs(company, website_data, linkedin_data)
+        entry = previous.get(company['name'])
+        if entry and is_current(entry, fingerprint):
+            results.append((company, entry))
+        else:
+            changed.append((company, website_data, linkedin_data, fingerprint, skipped))
     
-    max_scores = {
-        "Company Profile": 4,
-        "Customer Focus": 4,
-        "Tech Stack Expertise": 3,
-        "Strategic Alignment": 3,
-        "Specializations": 3
-    }
+    if changed:
+        score_data, recommendations = evaluate_companies([record[:3] for record in changed])
+        for (company, website_data, linkedin_data, fingerprint, skipped), company_score, company_recommendations in zip(changed, score_data, recommendations):
+            results.append((company, build_analysis(company, website_data, linkedin_data, company_score, fingerprint=fingerprint, skipped=skipped, recommendations=company_recommendations)))
     
-    # Score Company Profile
-    if company_data["employees"] >= 51:
-        score["Company Profile"] += 1
+    return results
+
+# Function to analyze a stream of companies, yielding (company, analysis) as they finish
+def iter_analyze_companies(companies, linkedin_username=None, linkedin_password=None, max_workers=DEFAULT_MAX_WORKERS, previous=None, batch_size=ANALYSIS_BATCH_SIZE, fit_threshold=ENRICHMENT_FIT_THRESHOLD):
+    # Enrichment is staged, cheapest signal first: the search fields are
+    # already known, the website is crawled next, and LinkedIn (rate limited
+    # and budgeted) is only asked when its answer could still change a
+    # category score and the company could still reach fit_threshold.
+    # Lookups run on one bounded pool with a bounded window of companies in
+    # flight, and finished companies are scored in vectorized batches. A
+    # company with missing data still gets a provisional analysis.
+    previous = previous or {}
+    max_workers = max(1, max_workers)
+    ctx = get_script_run_ctx(suppress_warning=True)
     
-    if linkedin_data and len(linkedin_data["key_executives"]) >= 3:
-        score["Company Profile"] += 1
+    def attach_ctx():
+        if ctx is not None:
+            add_script_run_ctx(ctx=ctx)
     
-    if website_data and len(website_data["services"]) >= 4:
-        score["Company Profile"] += 1
+    companies = iter(companies)
+    seen = set()
+    futures = {}
+    in_flight = set()
+    enriched = []
+    # Companies waiting for LinkedIn, looked up together once a batch is full
+    # or no website crawl is left to add to it
+    linkedin_pending = []
     
-    if website_data and website_data["case_studies"] >= 5:
-        score["Company Profile"] += 1
+    with ThreadPoolExecutor(max_workers=max_workers, initializer=attach_ctx) as executor:
+        def submit_more():
+            while len(in_flight) < max_workers * 4:
+                company = next(companies, None)
+                if company is None:
+                    return
+                if company['name'] in seen:
+                    continue
+                seen.add(company['name'])
+                in_flight.add(company['name'])
+                futures[executor.submit(scrape_company_website, company['website'])] = (company, "website_data", None)
+        
+        def submit_linkedin():
+            nonlocal linkedin_pending
+            crawling = any(field == "website_data" for _, field, _ in futures.values())
+            while linkedin_pending and (len(linkedin_pending) >= LINKEDIN_BATCH_SIZE or not crawling):
+                batch, linkedin_pending = linkedin_pending[:LINKEDIN_BATCH_SIZE], linkedin_pending[LINKEDIN_BATCH_SIZE:]
+                names = [company['name'] for company, _ in batch]
+                futures[executor.submit(get_linkedin_data_batch, names, linkedin_username, linkedin_password)] = (None, "linkedin_batch", batch)
+        
+        submit_more()
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                company, field, website_data = futures.pop(future)
+                if field == "linkedin_batch":
+                    try:
+                        found = future.result()
+                    except Exception as e:
+                        logger.error("LinkedIn lookup for %d companies failed: %s", len(website_data), e)
+                        found = {}
+                    for company, company_website_data in website_data:
+                        enriched.append((company, company_website_data, found.get(company['name']), ()))
+                        in_flight.discard(company['name'])
+                    continue
+                
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error("Lookup of %s for %s failed: %s", field, company['name'], e)
+                    result = None
+                
+                if needs_linkedin(company, result, fit_threshold):
+                    linkedin_pending.append((company, result))
+                    continue
+                enriched.append((company, result, None, ("linkedin",)))
+                in_flight.discard(company['name'])
+            
+            submit_more()
+            submit_linkedin()
+            if len(enriched) >= batch_size:
+                yield from _score_enriched(enriched, previous)
+                enriched = []
     
-    # Score Customer Focus
-    if linkedin_data and linkedin_data["enterprise_clients"]:
-        score["Customer Focus"] += 2
+    if enriched:
+        yield from _score_enriched(enriched, previous)
+
+# Function to analyze many companies at once
+def analyze_companies(companies, linkedin_username=None, linkedin_password=None, max_workers=DEFAULT_MAX_WORKERS, progress_callback=None, previous=None, fit_threshold=ENRICHMENT_FIT_THRESHOLD):
+    # failed lists the companies whose lookups came back empty; they still
+    # get a provisional analysis
+    results = {}
+    failed = []
+    total = len(companies)
+    done = 0
     
-    if website_data and website_data["enterprise_focus"]:
-        score["Customer Focus"] += 1
+    for company, analysis in iter_analyze_companies(companies, linkedin_username, linkedin_password, max_workers, previous, fit_threshold=fit_threshold):
+        results[company['name']] = analysis
+        if analysis["missing_sources"]:
+            failed.append(company['name'])
+        
+        done += 1
+        if progress_callback:
+            progress_callback(done, total)
     
-    if website_data and len(website_data["target_industries"]) >= 2:
-        score["Customer Focus"] += 1
+    return results, failed
+
+# Function to bring a kept feature frame (one row per company name, with the
+# fingerprint of the inputs each row was built from) in step with the
+# analyses. Only new companies and companies whose inputs changed get their
+# rows built; the whole frame only when the rules need a column it lacks.
+def update_feature_frame(features, analysis):
+    fingerprints = pd.Series([entry.get("fingerprint") for entry in analysis.values()], index=list(analysis), dtype=object)
+    if features is not None and not set(get_ipp_rules().feature_column_names) <= set(features.columns):
+        features = None
     
-    # Score Tech Stack Expertise
-    if website_data and len(website_data["technologies"]) >= 3:
-        score["Tech Stack Expertise"] += 1
+    if features is None:
+        rebuild = fingerprints.index
+    else:
+        known = features["fingerprint"].reindex(fingerprints.index).to_numpy(dtype=object)
+        rebuild = fingerprints.index[known != fingerprints.to_numpy()]
     
-    has_enterprise_tech = False
-    if website_data and website_data["technologies"]:
-        enterprise_tech = ["Salesforce", "Oracle", "SAP", "Microsoft Dynamics", "Marketo", "Adobe"]
-        if any(tech in enterprise_tech for tech in website_data["technologies"]):
-            has_enterprise_tech = True
-            score["Tech Stack Expertise"] += 1
+    if len(rebuild):
+        rows = build_feature_frame([(analysis[name]["company"], analysis[name]["website_data"], analysis[name]["linkedin_data"]) for name in rebuild])
+        rows.index = rebuild
+        rows["fingerprint"] = fingerprints[rebuild].to_numpy()
+        features = rows if features is None else pd.concat([features.drop(rebuild, errors="ignore"), rows])
+    return features.reindex(fingerprints.index)
+
+# Function to re-score stored analyses when the IPP rules have changed. Analyses
+# scored under other rules are stale; their inputs are unchanged, so their
+# fingerprints are kept. features, when given, is a frame from
+# update_feature_frame and is scored instead of rebuilding features.
+def rescore_analyses(analysis, features=None):
+    version = get_ipp_rules().version
+    stale = [name for name, entry in analysis.items() if entry.get("criteria_version") != version]
+    if not stale:
+        return {}
     
-    if has_enterprise_tech and "Integration" in str(website_data.get("services", [])):
-        score["Tech Stack Expertise"] += 1
+    if features is None:
+        rows = build_feature_frame([(analysis[name]["company"], analysis[name]["website_data"], analysis[name]["linkedin_data"]) for name in stale])
+    else:
+        rows = features if len(stale) == len(features) else features.loc[stale]
+    memo = {}
+    scores = score_feature_frame(rows, memo)
+    score_data = score_frame_to_dicts(scores)
+    recommendations = recommend_feature_frame(rows, scores, memo)
+    lower, upper = score_bounds_frame(rows, memo)
     
-    # Score Strategic Alignment
-    strategic_alignment_potential = 0
+    # Only the scores change; everything derived from the inputs is kept
+    results = {}
+    for name, company_score, company_recommendations, low, high in zip(stale, score_data, recommendations, lower.tolist(), upper.tolist()):
+        entry = analysis[name]
+        if "provisional" not in entry:
+            results[name] = build_analysis(entry["company"], entry["website_data"], entry["linkedin_data"], company_score, skipped=entry.get("skipped_sources", ()), recommendations=company_recommendations)
+            continue
+        updated = dict(entry, score_data=company_score, recommendations=company_recommendations, criteria_version=version)
+        if "criteria_version" not in entry:
+            # Analyses from before criteria_version hashed the rules into the fingerprint
+            updated["fingerprint"] = fingerprint_inputs(entry["company"], entry["website_data"], entry["linkedin_data"])
+        if entry.get("provisional"):
+            updated["score_range"] = (low, high)
+        results[name] = updated
+    return results
+
+# Function to record analyses in session state and keep the ranking in sync
+def store_analyses(results):
+    if not hasattr(st.session_state, 'analysis'):
+        st.session_state.analysis = {}
+    if not hasattr(st.session_state, 'ranking'):
+        st.session_state.ranking = PartnerRanking(st.session_state.analysis)
     
-    if linkedin_data and "CTO" in str(linkedin_data["key_executives"]):
-        strategic_alignment_potential += 1
+    st.session_state.analysis.update(results)
+    # Tables key on this, so a row selection doesn't outlive the results it was made on
+    st.session_state.analysis_version = st.session_state.get('analysis_version', 0) + 1
+    st.session_state.ranking.update_many({name: analysis["score_data"]["overall_match"] for name, analysis in results.items()})
+
+# Function to score every company in the shared store, keeping its records as views
+def analyze_stored_companies(store, previous=None, batch_size=ANALYSIS_BATCH_SIZE):
+    results = {}
+    for chunk in _chunked(store.records(), batch_size):
+        # Scoring reads each field several times, so decode each record once
+        # for it; the stored analyses then point back at the views
+        views = {record[0]['name']: record for record in chunk}
+        decoded = [tuple(None if view is None else dict(view) for view in record) + ((),) for record in chunk]
+        for company, analysis in _score_enriched(decoded, previous or {}):
+            if analysis.get("company") is not views[company['name']][0]:
+                analysis = dict(analysis, **dict(zip(STORE_SOURCES, views[company['name']])))
+            results[company['name']] = analysis
+    return results
+
+# Background job queue: on-disk location, companies per work item, lease length
+# (seconds) and how often a failing item is retried before it is given up
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", ".partner_jobs.sqlite3")
+JOB_ITEM_SIZE = int(os.getenv("JOB_ITEM_SIZE", "25"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+JOB_MAX_ATTEMPTS = 3
+
+# Worker processes the app starts for background runs (one per core by default)
+JOB_WORKER_PROCESSES = int(os.getenv("JOB_WORKER_PROCESSES", str(os.cpu_count() or 2)))
+
+# Seconds between progress polls in the UI and between empty queue polls in a worker
+JOB_POLL_INTERVAL = 2.0
+
+# Durable queue of analysis runs, shared by the app and any number of worker processes
+class JobQueue:
+    def __init__(self, path=JOB_QUEUE_PATH, lease_seconds=JOB_LEASE_SECONDS, max_attempts=JOB_MAX_ATTEMPTS):
+        # A run is split into items of a few companies each. Workers lease one
+        # item at a time; a worker that dies simply lets its lease run out and
+        # the item goes back to the next worker, so runs survive crashes and
+        # restarts. An item's results are committed together with its status.
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            "run_id TEXT PRIMARY KEY, options TEXT NOT NULL, total INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, cancelled INTEGER NOT NULL DEFAULT 0);"
+            "CREATE TABLE IF NOT EXISTS items ("
+            "item_id INTEGER PRIMARY KEY, run_id TEXT NOT NULL, companies TEXT NOT NULL, size INTEGER NOT NULL, "
+            "status TEXT NOT NULL DEFAULT 'queued', attempts INTEGER NOT NULL DEFAULT 0, "
+            "worker TEXT, lease_until REAL, error TEXT);"
+            "CREATE INDEX IF NOT EXISTS items_pending ON items (status, lease_until);"
+            "CREATE INDEX IF NOT EXISTS items_run ON items (run_id, status);"
+            "CREATE TABLE IF NOT EXISTS results ("
+            "seq INTEGER PRIMARY KEY, run_id TEXT NOT NULL, name TEXT NOT NULL, analysis TEXT NOT NULL, "
+            "UNIQUE (run_id, name));"
+        )
+        self._conn.commit()
     
-    if website_data and "HubSpot" in str(website_data.get("technologies", [])):
-        strategic_alignment_potential += 2
-    elif website_data and any(crm in str(website_data.get("services", [])) for crm in ["CRM", "Customer Relationship"]):
-        strategic_alignment_potential += 1
+    # Function to queue a run over the given companies; returns its run id
+    def submit(self, companies, options=None, item_size=JOB_ITEM_SIZE):
+        run_id = uuid.uuid4().hex[:12]
+        total = 0
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO runs (run_id, options, total, created_at) VALUES (?, ?, 0, ?)",
+                (run_id, json.dumps(options or {}), time.time())
+            )
+            for chunk in _chunked(companies, item_size):
+                self._conn.execute(
+                    "INSERT INTO items (run_id, companies, size) VALUES (?, ?, ?)",
+                    (run_id, json.dumps(chunk, default=_json_default), len(chunk))
+                )
+                total += len(chunk)
+            self._conn.execute("UPDATE runs SET total = ? WHERE run_id = ?", (total, run_id))
+        return run_id
     
-    score["Strategic Alignment"] = min(strategic_alignment_potential, max_scores["Strategic Alignment"])
+    # Function to lease the oldest pending item, or one whose worker stopped
+    # renewing its lease. Returns None when there is nothing to do.
+    def lease(self, worker):
+        now = time.time()
+        with self._lock:
+            # BEGIN IMMEDIATE takes the write lock up front, so two workers
+            # can't pick the same item
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT items.item_id, items.run_id, items.companies, runs.options FROM items "
+                    "JOIN runs ON runs.run_id = items.run_id "
+                    "WHERE runs.cancelled = 0 AND items.attempts < ? "
+                    "AND (items.status = 'queued' OR (items.status = 'leased' AND items.lease_until < ?)) "
+                    "ORDER BY items.item_id LIMIT 1",
+                    (self.max_attempts, now)
+                ).fetchone()
+                if row:
+                    self._conn.execute(
+                        "UPDATE items SET status = 'leased', attempts = attempts + 1, worker = ?, lease_until = ? WHERE item_id = ?",
+                        (worker, now + self.lease_seconds, row[0])
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        
+        if not row:
+            return None
+        return {"item_id": row[0], "run_id": row[1], "companies": json.loads(row[2]), "options": json.loads(row[3])}
     
-    # Score Specializations
-    specializations = set()
-    if "Digital Marketing" in company_data.get("specializations", []) or any(s in str(website_data.get("services", [])) for s in ["SEO", "PPC", "Social Media", "Content"]):
-        specializations.add("Digital Marketing")
+    # Function to extend a lease while its item is still being worked on
+    def heartbeat(self, item_id, worker):
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE items SET lease_until = ? WHERE item_id = ? AND worker = ? AND status = 'leased'",
+                (time.time() + self.lease_seconds, item_id, worker)
+            )
+        # False: the lease ran out and another worker took the item over
+        return cursor.rowcount == 1
     
-    if "CRM" in company_data.get("specializations", []) or "CRM" in str(website_data.get("services", [])):
-        specializations.add("CRM Implementation")
+    # Function to store an item's analyses and mark it done, atomically
+    def complete(self, item_id, run_id, analyses):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO results (run_id, name, analysis) VALUES (?, ?, ?)",
+                [(run_id, name, json.dumps(analysis, default=_json_default)) for name, analysis in analyses.items()]
+            )
+            self._conn.execute("UPDATE items SET status = 'done', lease_until = NULL, error = NULL WHERE item_id = ?", (item_id,))
     
-    if "RevOps" in company_data.get("specializations", []) or "Revenue Operations" in str(website_data.get("services", [])):
-        specializations.add("RevOps")
+    # Function to hand a failed item back to the queue, or give up on it
+    # after max_attempts
+    def fail(self, item_id, error):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE items SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+                "lease_until = NULL, error = ? WHERE item_id = ?",
+                (self.max_attempts, str(error), item_id)
+            )
     
-    score["Specializations"] = min(len(specializations), max_scores["Specializations"])
+    # Function to stop handing out a run's remaining items
+    def cancel(self, run_id):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE runs SET cancelled = 1 WHERE run_id = ?", (run_id,))
     
-    # Calculate percentage scores
-    percentage_scores = {}
-    for category, value in score.items():
-        percentage_scores[category] = (value / max_scores[category]) * 100
+    # Function to summarize a run: companies done/failed/pending and whether it has finished
+    def progress(self, run_id):
+        with self._lock:
+            run = self._conn.execute("SELECT total, cancelled, created_at FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+            if not run:
+                return None
+            counts = dict(self._conn.execute(
+                "SELECT status, SUM(size) FROM items WHERE run_id = ? GROUP BY status", (run_id,)
+            ).fetchall())
+            # Items that used up their attempts while leased by a crashed worker
+            (exhausted,) = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM items WHERE run_id = ? AND status = 'leased' AND attempts >= ? AND lease_until < ?",
+                (run_id, self.max_attempts, time.time())
+            ).fetchone()
+            errors = [error for (error,) in self._conn.execute(
+                "SELECT error FROM items WHERE run_id = ? AND error IS NOT NULL LIMIT 5", (run_id,)
+            )]
+        
+        total, cancelled, created_at = run
+        done = counts.get("done", 0)
+        failed = counts.get("failed", 0) + exhausted
+        return {
+            "run_id": run_id,
+            "total": total,
+            "done": done,
+            "failed": failed,
+            "pending": total - done - failed,
+            "cancelled": bool(cancelled),
+            "finished": bool(cancelled) or done + failed >= total,
+            "created_at": created_at,
+            "errors": errors
+        }
     
-    # Calculate overall match percentage
-    total_score = sum(score.values())
-    max_total = sum(max_scores.values())
-    overall_match = (total_score / max_total) * 100
+    # Function to read a run's analyses stored after result number `since`;
+    # returns (analyses by company name, last result number)
+    def results(self, run_id, since=0):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, name, analysis FROM results WHERE run_id = ? AND seq > ? ORDER BY seq", (run_id, since)
+            ).fetchall()
+        analyses = {name: json.loads(analysis) for _, name, analysis in rows}
+        return analyses, rows[-1][0] if rows else since
     
-    return {
-        "detailed_scores": score,
-        "percentage_scores": percentage_scores,
-        "overall_match": overall_match,
-        "specializations": list(specializations)
-    }
+    def close(self):
+        with self._lock:
+            self._conn.close()
 
-# Function to generate recommendations
-def generate_recommendations(company_data, score_data, website_data, linkedin_data):
-    recommendations = []
+# Shared job queue handle, kept across Streamlit reruns and sessions
+@st.cache_resource
+def get_job_queue():
+    return JobQueue(JOB_QUEUE_PATH)
+
+# Function to keep renewing an item's lease from a background thread while the
+# with block works on it. Results only come out of iter_analyze_companies in
+# batches, so renewing between results could leave a slow item unrenewed.
+@contextmanager
+def keep_leased(queue, item, worker):
+    done = threading.Event()
     
-    # Evaluate company profile
-    if score_data["percentage_scores"]["Company Profile"] < 75:
-        if company_data["employees"] < 51:
-            recommendations.append("Company size is below the recommended 51+ employees for Upmarket IPP")
-        
-        if not linkedin_data or len(linkedin_data["key_executives"]) < 3:
-            recommendations.append("Consider establishing a clearer organizational structure with defined roles in Marketing, Sales, Professional Services, and Customer Success")
+    def renew():
+        while not done.wait(queue.lease_seconds / 3):
+            if not queue.heartbeat(item["item_id"], worker):
+                logger.warning("Lost the lease on item %s of run %s", item["item_id"], item["run_id"])
+                return
     
-    # Evaluate customer focus
-    if score_data["percentage_scores"]["Customer Focus"] < 75:
-        if not linkedin_data or not linkedin_data["enterprise_clients"]:
-            recommendations.append("Focus on targeting and showcasing enterprise clients (201+ employees)")
+    thread = threading.Thread(target=renew, name=f"lease-{item['item_id']}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        done.set()
+        thread.join()
+
+# Function to work through queued items until stopped (or, with exit_when_idle,
+# until the queue is empty). Each process runs its own lookup thread pool, so a
+# few worker processes use every core for parsing and scoring.
+def run_worker(queue_path=JOB_QUEUE_PATH, max_workers=DEFAULT_MAX_WORKERS, exit_when_idle=False, stop_event=None):
+    queue = JobQueue(queue_path)
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    linkedin_username = os.getenv("LINKEDIN_USERNAME")
+    linkedin_password = os.getenv("LINKEDIN_PASSWORD")
+    processed = 0
+    logger.info("Worker %s polling %s", worker, queue_path)
+    
+    while not (stop_event and stop_event.is_set()):
+        item = queue.lease(worker)
+        if item is None:
+            if exit_when_idle:
+                break
+            time.sleep(JOB_POLL_INTERVAL)
+            continue
         
-        if not website_data or not website_data["enterprise_focus"]:
-            recommendations.append("Highlight ability to support environments with 101+ users")
+        options = item["options"]
+        analyses = {}
+        try:
+            with keep_leased(queue, item, worker):
+                for company, analysis in iter_analyze_companies(
+                    item["companies"],
+                    linkedin_username,
+                    linkedin_password,
+                    max_workers=max_workers,
+                    fit_threshold=options.get("fit_threshold", ENRICHMENT_FIT_THRESHOLD)
+                ):
+                    analyses[company['name']] = analysis
+        except Exception as e:
+            logger.exception("Item %s of run %s failed", item["item_id"], item["run_id"])
+            queue.fail(item["item_id"], e)
+            continue
         
-        if not website_data or len(website_data["target_industries"]) < 2:
-            recommendations.append("Develop and showcase deeper industry expertise in specific sectors")
+        queue.complete(item["item_id"], item["run_id"], analyses)
+        processed += len(analyses)
     
-    # Evaluate tech stack expertise
-    if score_data["percentage_scores"]["Tech Stack Expertise"] < 75:
-        if not website_data or len(website_data["technologies"]) < 3:
-            recommendations.append("Expand expertise in enterprise software tools and highlight them in marketing materials")
-        
-        if not website_data or "Integration" not in str(website_data.get("services", [])):
-            recommendations.append("Develop custom solution capabilities using APIs and SDKs")
+    queue.close()
+    return processed
+
+# Background worker processes started by the app and shared by every session
+class WorkerPool:
+    def __init__(self, processes=JOB_WORKER_PROCESSES, queue_path=JOB_QUEUE_PATH):
+        self.processes = max(1, processes)
+        self.queue_path = queue_path
+        self._lock = threading.Lock()
+        self._workers = []
+        atexit.register(self.stop)
     
-    # Evaluate strategic alignment
-    if score_data["percentage_scores"]["Strategic Alignment"] < 75:
-        if not "HubSpot" in str(website_data.get("technologies", [])):
-            recommendations.append("Consider establishing a HubSpot practice or partnering with HubSpot")
-        
-        recommendations.append("Designate an Executive Sponsor and Business Champion for the HubSpot relationship")
+    # Function to (re)start workers so the configured number are running
+    def ensure_running(self):
+        cli_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cli.py")
+        with self._lock:
+            self._workers = [worker for worker in self._workers if worker.poll() is None]
+            while len(self._workers) < self.processes:
+                self._workers.append(subprocess.Popen(
+                    [sys.executable, cli_path, "worker", "--queue", self.queue_path, "--processes", "1"],
+                    stdin=subprocess.DEVNULL
+                ))
+        return len(self._workers)
+    
+    def stop(self):
+        with self._lock:
+            for worker in self._workers:
+                worker.terminate()
+            for worker in self._workers:
+                worker.wait()
+            self._workers = []
+
+@st.cache_resource
+def get_worker_pool():
+    return WorkerPool(JOB_WORKER_PROCESSES, JOB_QUEUE_PATH)
+
+# Records buffered per write when exporting analyses
+EXPORT_CHUNK_SIZE = 1000
+EXPORT_FORMATS = ["jsonl", "parquet"]
+
+# Function to turn an analysis entry into its export record
+def export_record(analysis):
+    return {
+        "company": analysis["company"],
+        "website_data": analysis["website_data"],
+        "linkedin_data": analysis["linkedin_data"],
+        "score_data": analysis["score_data"],
+        "recommendations": analysis["recommendations"],
+        "provisional": analysis.get("provisional", False)
+    }
+
+# Function to group an iterable into lists of at most chunk_size items
+def _chunked(items, chunk_size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+# Function to stream analyses to a text file as JSON lines, one chunk per write
+def write_jsonl(analyses, out, chunk_size=EXPORT_CHUNK_SIZE):
+    count = 0
+    for chunk in _chunked(analyses, chunk_size):
+        out.write("".join(json.dumps(export_record(analysis), default=_json_default) + "\n" for analysis in chunk))
+        count += len(chunk)
+    return count
+
+# Function to flatten an analysis into one Parquet row
+def _parquet_row(analysis):
+    company = analysis["company"]
+    website_data = analysis["website_data"] or {}
+    linkedin_data = analysis["linkedin_data"] or {}
+    score_data = analysis["score_data"]
+    
+    row = {
+        "name": company['name'],
+        "website": company.get('website'),
+        "location": company.get('location'),
+        "industry": company.get('industry'),
+        "employees": company.get('employees'),
+        "founded": company.get('founded'),
+        "company_specializations": list(company.get('specializations', [])),
+        "overall_match": score_data["overall_match"],
+        "provisional": analysis.get("provisional", False),
+        "specializations": list(score_data["specializations"]),
+        "recommendations": list(analysis["recommendations"]),
+        "technologies": list(website_data.get("technologies", [])),
+        "services": list(website_data.get("services", [])),
+        "target_industries": list(website_data.get("target_industries", [])),
+        "case_studies": website_data.get("case_studies"),
+        "enterprise_focus": website_data.get("enterprise_focus"),
+        "linkedin_followers": linkedin_data.get("follower_count"),
+        "linkedin_employees": linkedin_data.get("employee_count"),
+        "website_data": json.dumps(analysis["website_data"], default=_json_default),
+        "linkedin_data": json.dumps(analysis["linkedin_data"], default=_json_default)
+    }
+    for category, percentage in score_data["percentage_scores"].items():
+        row[f"{category} %"] = percentage
+    return row
+
+def _parquet_schema(pa):
+    strings = pa.list_(pa.string())
+    fields = [
+        ("name", pa.string()), ("website", pa.string()), ("location", pa.string()), ("industry", pa.string()),
+        ("employees", pa.int64()), ("founded", pa.int64()), ("company_specializations", strings),
+        ("overall_match", pa.float64()), ("provisional", pa.bool_()), ("specializations", strings), ("recommendations", strings),
+        ("technologies", strings), ("services", strings), ("target_industries", strings),
+        ("case_studies", pa.int64()), ("enterprise_focus", pa.bool_()),
+        ("linkedin_followers", pa.int64()), ("linkedin_employees", pa.int64()),
+        ("website_data", pa.string()), ("linkedin_data", pa.string())
+    ]
+    fields += [(f"{category} %", pa.float64()) for category in get_ipp_rules().max_scores]
+    return pa.schema(fields)
+
+# Function to stream analyses to a Parquet file, one row group per chunk
+def write_parquet(analyses, path, chunk_size=EXPORT_CHUNK_SIZE):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)")
+    
+    schema = _parquet_schema(pa)
+    count = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in _chunked(analyses, chunk_size):
+            writer.write_table(pa.Table.from_pylist([_parquet_row(analysis) for analysis in chunk], schema=schema))
+            count += len(chunk)
+    return count
+
+# Function to export analyses to a file in the given format
+def export_analyses(analyses, path, export_format="jsonl", chunk_size=EXPORT_CHUNK_SIZE):
+    if export_format == "parquet":
+        return write_parquet(analyses, path, chunk_size)
+    if export_format == "jsonl":
+        with open(path, "w", encoding="utf-8") as out:
+            return write_jsonl(analyses, out, chunk_size)
+    raise ValueError(f"Unknown export format: {export_format}")
+
+# HubSpot CRM push settings. The ipp_* company properties must exist in the portal.
+CRM_API_BASE = os.getenv("CRM_API_BASE", "https://api.hubapi.com")
+CRM_UPSERT_PATH = "/crm/v3/objects/companies/batch/upsert"
+CRM_BATCH_SIZE = 100
+CRM_REQUESTS_PER_SECOND = 9
+CRM_MAX_RETRIES = 5
+CRM_BACKOFF_BASE = 0.5
+CRM_BACKOFF_CAP = 30.0
+
+# Function to map an analysis to HubSpot company properties
+def crm_properties(analysis):
+    company = analysis["company"]
+    score_data = analysis["score_data"]
+    return {
+        "name": company['name'],
+        "domain": normalize_domain(company.get('website')),
+        "numberofemployees": str(company.get('employees', "")),
+        "description": company.get('description', ""),
+        "ipp_overall_match": f"{score_data['overall_match']:.1f}",
+        "ipp_specializations": ";".join(score_data["specializations"]),
+        "ipp_recommendations": "\n".join(analysis["recommendations"])
+    }
+
+# Pushes scored partners to a HubSpot-style CRM with batched, idempotent upserts
+class CrmClient:
+    def __init__(self, token, base_url=CRM_API_BASE, session=None, cache=None, batch_size=CRM_BATCH_SIZE, rate=CRM_REQUESTS_PER_SECOND, max_retries=CRM_MAX_RETRIES):
+        self.base_url = base_url.rstrip("/")
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.cache = cache
+        self.limiter = TokenBucket(rate)
+        self.session = session or requests.Session()
+        self.session.headers["Authorization"] = f"Bearer {token}"
+        self.session.headers["Content-Type"] = "application/json"
+        # Sync state is kept per CRM endpoint and token (i.e. per portal), so
+        # a push to one portal never marks records as synced in another
+        self.sync_scope = hashlib.sha256(f"{self.base_url}\0{token}".encode("utf-8")).hexdigest()[:16]
     
-    # Evaluate specializations
-    if score_data["percentage_scores"]["Specializations"] < 66:
-        missing_specializations = []
-        specializations = score_data.get("specializations", [])
+    def _sync_key(self, domain):
+        return f"{self.sync_scope}:{domain}"
+    
+    # Upserts by domain. Duplicate domains collapse to the last record and
+    # records unchanged since their last successful sync are skipped.
+    # Companies without a website domain can't be upserted and are listed
+    # by name in no_domain.
+    def upsert_partners(self, analyses):
+        records = OrderedDict()
+        no_domain = []
+        for analysis in analyses:
+            properties = crm_properties(analysis)
+            if properties["domain"]:
+                records[properties["domain"]] = properties
+            else:
+                no_domain.append(properties["name"])
         
-        if "Digital Marketing" not in specializations:
-            missing_specializations.append("Digital Marketing")
+        result = {"sent": 0, "skipped": 0, "batches": 0, "failed": [], "no_domain": no_domain}
+        inputs = []
+        for domain, properties in records.items():
+            digest = hashlib.sha1(json.dumps(properties, sort_keys=True).encode("utf-8")).hexdigest()
+            if self.cache and self.cache.get("crm_sync", self._sync_key(domain)) == digest:
+                result["skipped"] += 1
+                continue
+            inputs.append((domain, digest, {"idProperty": "domain", "id": domain, "properties": properties}))
         
-        if "CRM Implementation" not in specializations:
-            missing_specializations.append("CRM Implementation")
+        for start in range(0, len(inputs), self.batch_size):
+            batch = inputs[start:start + self.batch_size]
+            result["batches"] += 1
+            failed = self._post_batch([item[2] for item in batch])
+            for domain, digest, _ in batch:
+                if domain in failed:
+                    result["failed"].append(domain)
+                    continue
+                result["sent"] += 1
+                if self.cache:
+                    self.cache.set("crm_sync", self._sync_key(domain), digest)
         
-        if "RevOps" not in specializations:
-            missing_specializations.append("RevOps")
+        return result
+    
+    # Posts one batch; returns the ids (domains) of the inputs that weren't upserted
+    def _post_batch(self, inputs):
+        ids = {item["id"] for item in inputs}
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            try:
+                response = self.session.post(f"{self.base_url}{CRM_UPSERT_PATH}", data=json.dumps({"inputs": inputs}), timeout=30)
+            except requests.RequestException as e:
+                logger.warning("CRM upsert failed (attempt %d): %s", attempt + 1, e)
+                response = None
+            
+            if response is not None:
+                if response.status_code == 207:
+                    return _multi_status_failures(response, ids)
+                if response.status_code < 300:
+                    return set()
+                if response.status_code != 429 and response.status_code < 500:
+                    logger.error("CRM upsert rejected with %s: %s", response.status_code, response.text[:500])
+                    return ids
+            
+            if attempt < self.max_retries:
+                # Exponential backoff with full jitter, never sooner than Retry-After
+                delay = random.uniform(0, min(CRM_BACKOFF_CAP, CRM_BACKOFF_BASE * 2 ** attempt))
+                if response is not None and response.headers.get("Retry-After", "").isdigit():
+                    delay = max(delay, float(response.headers["Retry-After"]))
+                time.sleep(delay)
         
-        if missing_specializations:
-            recommendations.append(f"Consider expanding services to include: {', '.join(missing_specializations)}")
+        logger.error("CRM upsert gave up after %d attempts", self.max_retries + 1)
+        return ids
+
+# Function to read the failed inputs out of a 207 Multi-Status batch response.
+# Each error names its inputs in context.ids; an error that names none (or a
+# body that can't be read) fails the whole batch, so nothing is marked synced
+# that may not have been written.
+def _multi_status_failures(response, ids):
+    try:
+        errors = response.json().get("errors") or []
+    except ValueError:
+        errors = None
+    if errors is None:
+        logger.error("CRM upsert returned 207 with an unreadable body")
+        return ids
+    
+    failed = set()
+    for error in errors:
+        context = error.get("context") or {}
+        named = [str(i) for key in ("ids", "id") for i in context.get(key) or [] if str(i) in ids]
+        logger.error("CRM upsert failed for %s: %s", ", ".join(named) or "the batch", error.get("message"))
+        if not named:
+            return ids
+        failed.update(named)
+    return failed
+
+# Shared CRM client per token, kept across Streamlit reruns
+@st.cache_resource
+def get_crm_client(token, base_url=CRM_API_BASE):
+    return CrmClient(token, base_url, cache=get_enrichment_cache())
+
+# Function to push analyses to the CRM from the UI and report the outcome
+def push_to_crm(token, analyses):
+    if not token:
+        st.warning("Enter a HubSpot private app token in the sidebar to push to the CRM.")
+        return
+    
+    with st.spinner("Pushing to CRM..."):
+        result = get_crm_client(token).upsert_partners(analyses)
+    
+    if result["no_domain"]:
+        names = result["no_domain"]
+        st.warning(f"Skipped {len(names)} companies without a website domain ({', '.join(names[:5])}{', ...' if len(names) > 5 else ''}).")
+    if result["failed"]:
+        st.error(f"Failed to push {len(result['failed'])} companies to the CRM.")
+    if result["sent"]:
+        st.success(f"Pushed {result['sent']} companies in {result['batches']} requests ({result['skipped']} already up to date).")
+    elif not result["failed"]:
+        st.info(f"Nothing to push: {result['skipped']} companies already up to date.")
+
+# Page sizes offered for the result tables
+PAGE_SIZE_OPTIONS = [10, 25, 50, 100]
+
+# Function to render page controls and return the (start, stop) slice to show
+def render_pagination(key, total):
+    col1, col2, col3 = st.columns([1, 1, 2])
+    with col1:
+        page_size = st.selectbox("Rows per page", PAGE_SIZE_OPTIONS, index=1, key=f"{key}_page_size")
+    
+    pages = max(1, -(-total // page_size))
+    with col2:
+        page = st.number_input("Page", min_value=1, max_value=pages, value=1, step=1, key=f"{key}_page")
+    
+    start = (min(page, pages) - 1) * page_size
+    stop = min(start + page_size, total)
+    with col3:
+        st.caption(f"Showing {start + 1}-{stop} of {total}")
+    return start, stop
+
+# Function to read the selected row of a single-row table. A keyed table keeps
+# its selection across reruns, so a row past the end of the current page
+# falls back to the first row.
+def selected_row(selection, rows):
+    selected = selection.selection.rows[0] if selection.selection.rows else 0
+    return selected if 0 <= selected < rows else 0
+
+# Function to build the summary table of search results (built once per search)
+def build_companies_frame(companies):
+    return pd.DataFrame({
+        "Company": [c['name'] for c in companies],
+        "Location": [c['location'] for c in companies],
+        "Industry": [c['industry'] for c in companies],
+        "Employees": [c['employees'] for c in companies],
+        "Website": [c['website'] for c in companies],
+        "Specializations": [', '.join(c['specializations']) for c in companies]
+    })
+
+# Function to build the summary table for one page of ranked analyses
+def build_analysis_frame(names, analysis, start=0):
+    rows = []
+    for rank, name in enumerate(names, start=start + 1):
+        score_data = analysis[name]["score_data"]
+        row = {"Rank": rank, "Company": name, "Overall Match %": round(score_data["overall_match"], 1), "Provisional": analysis[name].get("provisional", False)}
+        for category, percentage in score_data["percentage_scores"].items():
+            row[category] = round(percentage, 1)
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+# Function to build the performance table from a metrics snapshot
+def build_metrics_frame(snapshot):
+    rows = []
+    for stage, data in sorted(snapshot["stages"].items()):
+        rows.append({
+            "Stage": stage,
+            "Calls": data["calls"],
+            "Errors %": round(data["error_rate"] * 100, 1),
+            "Empty": data["empty"],
+            "Mean ms": round(data["mean_seconds"] * 1000, 1),
+            "p50 ms": round(data["p50_seconds"] * 1000, 1),
+            "p95 ms": round(data["p95_seconds"] * 1000, 1),
+            "Max ms": round(data["max_seconds"] * 1000, 1),
+            "KB fetched": round(data["bytes"] / 1024, 1)
+        })
+    return pd.DataFrame(rows)
+
+# Function to render the bulk export controls for all analyzed companies
+def render_export_panel(ranking, analysis, crm_token=None):
+    st.markdown("#### Export All Analyses")
+    if st.button(f"Sync all {len(ranking)} companies to CRM", key="crm_sync_all"):
+        push_to_crm(crm_token, (analysis[name] for name in ranking.names()))
     
-    return recommendations
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        export_format = st.selectbox("Format", EXPORT_FORMATS, key="export_format")
+    
+    with col2:
+        if st.button(f"Prepare {export_format.upper()} export ({len(ranking)} companies)", key="prepare_export"):
+            # Written to a temp file in chunks, in ranking order, rather than built in memory
+            fd, path = tempfile.mkstemp(suffix=f".{export_format}", prefix="partner_analysis_")
+            os.close(fd)
+            try:
+                export_analyses((analysis[name] for name in ranking.names()), path, export_format)
+            except RuntimeError as e:
+                st.error(str(e))
+            else:
+                old_path = st.session_state.get('export_path')
+                if old_path and os.path.exists(old_path):
+                    os.remove(old_path)
+                st.session_state.export_path = path
+    
+    path = st.session_state.get('export_path')
+    if path and os.path.exists(path):
+        # Deferred: the file is read only when the button is clicked, not
+        # handed to the media manager on every rerun
+        def read_export():
+            with open(path, "rb") as f:
+                return f.read()
+        
+        st.download_button(
+            "Download export",
+            data=read_export,
+            file_name=f"partner_analysis{os.path.splitext(path)[1]}",
+            mime="application/octet-stream",
+            on_click="ignore",
+            key="download_export"
+        )
+
+# Function to render the detail panel for a search result
+def render_company_detail(index, company, linkedin_username=None, linkedin_password=None):
+    with st.expander(f"{company['name']} - {company['location']}", expanded=True):
+        col1, col2 = st.columns([2, 1])
+
+        with col1:
+            st.markdown(f"**Website:** {company['website']}")
+            st.markdown(f"**Industry:** {company['industry']}")
+            st.markdown(f"**Employees:** {company['employees']}")
+            st.markdown(f"**Founded:** {company['founded']}")
+            st.markdown(f"**Description:** {company['description']}")
+            st.markdown(f"**Specializations:** {', '.join(company['specializations'])}")
+
+        with col2:
+            if st.button(f"Analyze Fit for {company['name']}", key=f"analyze_{index}"):
+                with st.spinner(f"Analyzing {company['name']}..."):
+                    # Get website data
+                    website_data = scrape_company_website(company['website'])
+
+                    # Get LinkedIn data
+                    linkedin_data = get_linkedin_data(company['name'], linkedin_username, linkedin_password)
+
+                    # Score the company
+                    previous = st.session_state.get('analysis', {}).get(company['name'])
+                    analysis = build_analysis(company, website_data, linkedin_data, previous=previous)
+
+                    # Store analysis in session state
+                    store_analyses({company['name']: analysis})
+
+                    st.rerun()
+
+# Function to render the detail panel for an analyzed company
+def render_analysis_detail(company_name, analysis, crm_token=None):
+    company = analysis["company"]
+    score_data = analysis["score_data"]
+    website_data = analysis["website_data"]
+    linkedin_data = analysis["linkedin_data"]
+    recommendations = analysis["recommendations"]
+
+    with st.expander(f"{company_name} - {score_data['overall_match']:.1f}% Match", expanded=True):
+        st.markdown(f"### {company_name}")
+
+        col1, col2 = st.columns([3, 2])
+
+        with col1:
+            # Overall fit gauge chart
+            st.markdown(f"**Overall IPP Match:** {score_data['overall_match']:.1f}%")
+            if analysis.get("provisional"):
+                sources = analysis["missing_sources"] + [f"{source} (skipped)" for source in analysis["skipped_sources"]]
+                st.info(f"Provisional score without {', '.join(sources)} data; it could reach up to {analysis['score_range'][1]:.1f}%.")
+
+            # Category scores
+            st.markdown("#### Category Scores")
+            for category, percentage in score_data["percentage_scores"].items():
+                st.markdown(f"**{category}:** {percentage:.1f}%")
+
+            # Company details
+            st.markdown("#### Company Details")
+            st.markdown(f"**Employees:** {company['employees']}")
+            st.markdown(f"**Website:** {company['website']}")
+            st.markdown(f"**Specializations:** {', '.join(company['specializations'])}")
+
+            if linkedin_data:
+                st.markdown("#### LinkedIn Insights")
+                st.markdown(f"**LinkedIn Followers:** {linkedin_data['follower_count']}")
+                st.markdown(f"**LinkedIn Employee Count:** {linkedin_data['employee_count']}")
+                st.markdown(f"**Enterprise Clients:** {', '.join(linkedin_data['enterprise_clients'])}")
+
+                st.markdown("**Key Executives:**")
+                for exec in linkedin_data["key_executives"]:
+                    st.markdown(f"- {exec['name']} ({exec['title']})")
+
+        with col2:
+            # Website analysis
+            if website_data:
+                st.markdown("#### Website Analysis")
+                st.markdown(f"**Technologies:** {', '.join(website_data['technologies'])}")
+                st.markdown(f"**Services:** {', '.join(website_data['services'])}")
+                st.markdown(f"**Target Industries:** {', '.join(website_data['target_industries'])}")
+                st.markdown(f"**Case Studies:** {website_data['case_studies']}")
+
+            # Recommendations
+            st.markdown("#### Recommendations")
+            if recommendations:
+                for rec in recommendations:
+                    st.markdown(f"- {rec}")
+            else:
+                st.markdown("This company is an excellent match for the HubSpot Solution Partner Program!")
+
+        # Export options
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button(
+                "Export Analysis as JSON",
+                data=json.dumps(export_record(analysis), indent=2, default=_json_default),
+                file_name=f"{normalize_company_name(company_name).replace(' ', '_')}_analysis.json",
+                mime="application/json",
+                key=f"export_{company_name}"
+            )
+
+        with col2:
+            if st.button("Add to CRM", key=f"crm_{company_name}"):
+                push_to_crm(crm_token, [analysis])
+
+# Function to fold a background run's newly finished analyses into the session
+def collect_job_results(run_id):
+    seen_run, since = st.session_state.get('job_results_seq') or (None, 0)
+    results, seq = get_job_queue().results(run_id, since if seen_run == run_id else 0)
+    if results:
+        store_analyses(results)
+    st.session_state.job_results_seq = (run_id, seq)
+    return len(results)
+
+# Function to show a background run's progress, polling the queue until it finishes
+@st.fragment(run_every=JOB_POLL_INTERVAL)
+def render_job_progress(run_id):
+    progress = get_job_queue().progress(run_id)
+    if progress["finished"]:
+        # Redraw the whole page once, with every result in the tables
+        st.rerun(scope="app")
+
+    # Restarts workers that died, including after a server restart
+    workers = get_worker_pool().ensure_running()
+    finished = progress["done"] + progress["failed"]
+    st.progress(finished / progress["total"] if progress["total"] else 0.0, text=f"Background run {run_id}: {finished} of {progress['total']} companies analyzed by {workers} workers")
+    if progress["failed"]:
+        st.warning(f"{progress['failed']} companies failed after {JOB_MAX_ATTEMPTS} attempts: {'; '.join(progress['errors'])}")
+
+    collect_job_results(run_id)
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("Show results so far", key="job_refresh"):
+            st.rerun(scope="app")
+    with col2:
+        if st.button("Cancel run", key="job_cancel"):
+            get_job_queue().cancel(run_id)
+            st.rerun(scope="app")
+
+# Function to render the background run named in the page URL, if any
+def render_background_run():
+    run_id = st.query_params.get("run")
+    if not run_id:
+        return
+
+    progress = get_job_queue().progress(run_id)
+    if progress is None:
+        st.warning(f"Background run {run_id} was not found in the job queue.")
+        del st.query_params["run"]
+        return
+
+    if not progress["finished"]:
+        render_job_progress(run_id)
+        return
+
+    collect_job_results(run_id)
+    status = "cancelled" if progress["cancelled"] else "finished"
+    st.success(f"Background run {run_id} {status}: {progress['done']} of {progress['total']} companies analyzed.")
+    if progress["failed"]:
+        st.warning(f"{progress['failed']} companies failed after {JOB_MAX_ATTEMPTS} attempts: {'; '.join(progress['errors'])}")
+    if st.button("Dismiss", key="job_dismiss"):
+        del st.query_params["run"]
+        st.rerun()
 
 # Main app
 def main():
+    # Set page config
+    st.set_page_config(
+        page_title="HubSpot Partner Finder",
+        page_icon="🔍",
+        layout="wide"
+    )
+    
     st.title("🔍 HubSpot Partner Finder")
     st.subheader("Identify ideal partners for HubSpot's solution partner program")
     
@@ -371,10 +3766,61 @@ def main():
         linkedin_password = st.text_input("LinkedIn Password", type="password")
         clearbit_api_key = st.text_input("Clearbit API Key (optional)", type="password")
         hunter_api_key = st.text_input("Hunter.io API Key (optional)", type="password")
+        crm_token = st.text_input("HubSpot Private App Token (optional)", type="password", value=os.getenv("HUBSPOT_ACCESS_TOKEN", ""))
+    
+    with st.sidebar.expander("Batch Analysis", expanded=False):
+        max_workers = st.number_input("Concurrent lookups", min_value=1, max_value=128, value=DEFAULT_MAX_WORKERS, step=1)
+        top_k = st.number_input("Only rank the best K (0 = analyze all)", min_value=0, max_value=10000, value=0, step=10)
+        fit_threshold = st.slider("Skip LinkedIn when the best possible match is below (%)", min_value=0, max_value=100, value=int(ENRICHMENT_FIT_THRESHOLD))
+        background = st.checkbox(
+            f"Run in background ({JOB_WORKER_PROCESSES} worker processes)",
+            help="Queue the run for worker processes; it keeps going across page reloads. Workers use the LinkedIn credentials from the environment. Ignored when ranking only the best K."
+        )
+
+    with st.sidebar.expander("Enrichment Cache", expanded=False):
+        cache_stats = get_enrichment_cache().stats()
+        st.markdown(f"**Cached in memory:** {cache_stats['memory_entries']}")
+        st.markdown(f"**Cached on disk:** {cache_stats['disk_entries']}")
+        for source, counters in cache_stats["sources"].items():
+            hits = counters["memory_hits"] + counters["disk_hits"]
+            st.markdown(f"**{source}:** {hits} hits / {counters['misses']} misses")
+        if st.button("Clear Cache"):
+            get_enrichment_cache().clear()
+            st.rerun()
+    
+    with st.sidebar.expander("Performance", expanded=False):
+        snapshot = metrics_snapshot()
+        if snapshot["stages"]:
+            st.dataframe(build_metrics_frame(snapshot), hide_index=True, width="stretch")
+        else:
+            st.caption("No pipeline calls recorded yet.")
+        st.download_button(
+            "Download metrics JSON",
+            data=json.dumps(snapshot, indent=2),
+            file_name="partner_finder_metrics.json",
+            mime="application/json"
+        )
+        profile_next = st.checkbox("Profile the next batch analysis (cProfile + tracemalloc)")
+        if st.button("Reset Metrics"):
+            get_metrics().reset()
+            st.session_state.profile_report = None
+            st.rerun()
+        if st.session_state.get('profile_report'):
+            st.code(st.session_state.profile_report)
+    
+    store = get_enrichment_store()
+    if store:
+        with st.sidebar.expander("Shared Enrichment Store", expanded=False):
+            st.markdown(f"**Companies:** {len(store)}")
+            st.caption(store.path)
+            if st.button(f"Load all {len(store)} stored companies"):
+                with st.spinner("Scoring stored companies..."):
+                    store_analyses(analyze_stored_companies(store, getattr(st.session_state, 'analysis', None)))
+                st.rerun()
     
     # Display IPP criteria
     with st.sidebar.expander("Ideal Partner Profile Criteria", expanded=False):
-        for category, items in IPP_CRITERIA.items():
+        for category, items in get_ipp_rules().criteria.items():
             st.sidebar.subheader(category)
             for item in items:
                 st.sidebar.markdown(f"- {item}")
@@ -397,137 +3843,145 @@ def main():
     with col4:
         min_size = st.selectbox("Minimum company size", ["Any", "11-50", "51-200", "201-500", "501-1000", "1001+"], index=2)
     
+    col5, col6 = st.columns(2)
+    with col5:
+        max_results = st.number_input("Maximum results", min_value=1, max_value=100000, value=SEARCH_RESULT_LIMIT, step=50)
+    
+    with col6:
+        merge_previous = st.checkbox("Merge with previous results", help="Keep the companies already listed and add the new ones. Duplicates are collapsed before any lookups.")
+    
     if st.button("Search Companies"):
+        st.write(f"Searching for companies matching: {search_query}")
+        if not COMPANY_CORPUS_PATH:
+            st.warning("No company corpus configured (COMPANY_CORPUS_PATH). Searching demo data.")
+        
+        min_employees, max_employees = parse_size_range(min_size)
         with st.spinner("Searching for companies..."):
-            companies = search_companies(search_query, location, industry, clearbit_api_key)
+            companies = search_companies(search_query, location, industry, clearbit_api_key, min_employees=min_employees, limit=int(max_results))
             
             if not companies:
                 st.warning("No companies found. Try adjusting your search criteria.")
             else:
+                # Collapse duplicates across searches, and map companies that
+                # were already analyzed back to the name they were analyzed under
+                previous = (st.session_state.get('companies') or []) if merge_previous else []
+                analyzed = [entry["company"] for entry in (st.session_state.get('analysis') or {}).values()]
+                companies, aliases = resolve_companies(previous + companies, known=analyzed)
                 st.success(f"Found {len(companies)} potential partners")
+                if aliases:
+                    st.info(f"Merged {len(aliases)} duplicate listings ({', '.join(f'{alias} → {name}' for alias, name in list(aliases.items())[:5])}{', ...' if len(aliases) > 5 else ''}).")
                 
                 # Store companies in session state
                 st.session_state.companies = companies
+                st.session_state.companies_frame = build_companies_frame(companies)
+                st.session_state.companies_version = st.session_state.get('companies_version', 0) + 1
     
     # Display results if available
     if hasattr(st.session_state, 'companies') and st.session_state.companies:
         st.subheader("Potential Partners")
         
-        for i, company in enumerate(st.session_state.companies):
-            with st.expander(f"{company['name']} - {company['location']}", expanded=i==0):
-                col1, col2 = st.columns([2, 1])
-                
-                with col1:
-                    st.markdown(f"**Website:** {company['website']}")
-                    st.markdown(f"**Industry:** {company['industry']}")
-                    st.markdown(f"**Employees:** {company['employees']}")
-                    st.markdown(f"**Founded:** {company['founded']}")
-                    st.markdown(f"**Description:** {company['description']}")
-                    st.markdown(f"**Specializations:** {', '.join(company['specializations'])}")
-                
-                with col2:
-                    if st.button(f"Analyze Fit for {company['name']}", key=f"analyze_{i}"):
-                        with st.spinner(f"Analyzing {company['name']}..."):
-                            # Get website data
-                            website_data = scrape_company_website(company['website'])
-                            
-                            # Get LinkedIn data
-                            linkedin_data = get_linkedin_data(company['name'], linkedin_username, linkedin_password)
-                            
-                            # Score the company
-                            if website_data and linkedin_data:
-                                score_data = score_company(company, website_data, linkedin_data)
-                                recommendations = generate_recommendations(company, score_data, website_data, linkedin_data)
-                                
-                                # Store analysis in session state
-                                if not hasattr(st.session_state, 'analysis'):
-                                    st.session_state.analysis = {}
-                                
-                                st.session_state.analysis[company['name']] = {
-                                    "company": company,
-                                    "website_data": website_data,
-                                    "linkedin_data": linkedin_data,
-                                    "score_data": score_data,
-                                    "recommendations": recommendations
-                                }
-                                
-                                st.rerun()
-                            else:
-                                st.error("Unable to analyze company. Check API credentials and try again.")
+        if not linkedin_username or not linkedin_password:
+            st.warning("LinkedIn credentials not provided. Using mock data.")
+        
+        if st.button(f"Analyze All ({len(st.session_state.companies)} companies)", key="analyze_all"):
+            if background and not top_k:
+                run_id = get_job_queue().submit(st.session_state.companies, {"fit_threshold": fit_threshold})
+                get_worker_pool().ensure_running()
+                # The run id lives in the URL, so a reload picks the run back up
+                st.query_params["run"] = run_id
+                st.session_state.analysis_failures = []
+                st.session_state.top_k_stats = None
+                st.rerun()
+
+            with capture_profile() if profile_next else nullcontext() as capture:
+                if top_k:
+                    with st.spinner(f"Finding the best {int(top_k)} partners..."):
+                        results, stats = top_partners(
+                            st.session_state.companies,
+                            int(top_k),
+                            linkedin_username,
+                            linkedin_password,
+                            max_workers=int(max_workers),
+                            previous=st.session_state.get('analysis')
+                        )
+                    st.session_state.top_k_stats = stats
+                    failed = []
+                else:
+                    progress = st.progress(0.0, text="Analyzing companies...")
+                    
+                    def update_progress(done, total):
+                        progress.progress(done / total, text=f"Analyzed {done} of {total} companies")
+                    
+                    results, failed = analyze_companies(
+                        st.session_state.companies,
+                        linkedin_username,
+                        linkedin_password,
+                        max_workers=int(max_workers),
+                        progress_callback=update_progress,
+                        previous=st.session_state.get('analysis'),
+                        fit_threshold=fit_threshold
+                    )
+                    st.session_state.top_k_stats = None
+            
+            if capture:
+                st.session_state.profile_report = capture.report
+            
+            store_analyses(results)
+            
+            st.session_state.analysis_failures = failed
+            
+            st.rerun()
+        
+        if st.session_state.get('top_k_stats'):
+            stats = st.session_state.top_k_stats
+            st.info(f"Enriched {stats['enriched']} of {stats['candidates']} companies; {stats['pruned']} skipped as unable to reach the top {int(top_k)}.")
+        
+        if st.session_state.get('analysis_failures'):
+            failed = st.session_state.analysis_failures
+            st.warning(f"No website or LinkedIn data for {len(failed)} companies ({', '.join(failed[:5])}{', ...' if len(failed) > 5 else ''}); their scores are provisional. Check API credentials and try again.")
+        
+        if not hasattr(st.session_state, 'companies_frame'):
+            st.session_state.companies_frame = build_companies_frame(st.session_state.companies)
+        
+        start, stop = render_pagination("companies", len(st.session_state.companies))
+        page = st.session_state.companies_frame.iloc[start:stop]
+        table_key = f"companies_table_{st.session_state.get('companies_version', 0)}_{st.session_state.companies_page_size}_{start}"
+        selection = st.dataframe(page, hide_index=True, width="stretch", on_select="rerun", selection_mode="single-row", key=table_key)
+        
+        # Detail panel for the selected row only (defaults to the first row on the page)
+        index = start + selected_row(selection, stop - start)
+        render_company_detail(index, st.session_state.companies[index], linkedin_username, linkedin_password)
+    
+    # Progress of a queued background run, picked up again after a reload
+    render_background_run()
     
     # Display analysis if available
     if hasattr(st.session_state, 'analysis') and st.session_state.analysis:
         st.subheader("Partner Fit Analysis")
         
-        # Sort companies by overall match score
-        sorted_companies = sorted(
-            st.session_state.analysis.items(),
-            key=lambda x: x[1]["score_data"]["overall_match"],
-            reverse=True
-        )
+        # Re-score only when the IPP rules changed since the last rerun
+        if st.session_state.get('criteria_version') != get_ipp_rules().version:
+            # The feature frame is kept across reruns; only companies added or
+            # changed since the last re-score get their features built
+            st.session_state.feature_frame = update_feature_frame(st.session_state.get('feature_frame'), st.session_state.analysis)
+            rescored = rescore_analyses(st.session_state.analysis, st.session_state.feature_frame)
+            if rescored:
+                store_analyses(rescored)
+            st.session_state.criteria_version = get_ipp_rules().version
         
-        for company_name, analysis in sorted_companies:
-            company = analysis["company"]
-            score_data = analysis["score_data"]
-            website_data = analysis["website_data"]
-            linkedin_data = analysis["linkedin_data"]
-            recommendations = analysis["recommendations"]
-            
-            with st.expander(f"{company_name} - {score_data['overall_match']:.1f}% Match", expanded=True):
-                st.markdown(f"### {company_name}")
-                
-                col1, col2 = st.columns([3, 2])
-                
-                with col1:
-                    # Overall fit gauge chart
-                    st.markdown(f"**Overall IPP Match:** {score_data['overall_match']:.1f}%")
-                    
-                    # Category scores
-                    st.markdown("#### Category Scores")
-                    for category, percentage in score_data["percentage_scores"].items():
-                        st.markdown(f"**{category}:** {percentage:.1f}%")
-                    
-                    # Company details
-                    st.markdown("#### Company Details")
-                    st.markdown(f"**Employees:** {company['employees']}")
-                    st.markdown(f"**Website:** {company['website']}")
-                    st.markdown(f"**Specializations:** {', '.join(company['specializations'])}")
-                    
-                    if linkedin_data:
-                        st.markdown("#### LinkedIn Insights")
-                        st.markdown(f"**LinkedIn Followers:** {linkedin_data['follower_count']}")
-                        st.markdown(f"**LinkedIn Employee Count:** {linkedin_data['employee_count']}")
-                        st.markdown(f"**Enterprise Clients:** {', '.join(linkedin_data['enterprise_clients'])}")
-                        
-                        st.markdown("**Key Executives:**")
-                        for exec in linkedin_data["key_executives"]:
-                            st.markdown(f"- {exec['name']} ({exec['title']})")
-                
-                with col2:
-                    # Website analysis
-                    st.markdown("#### Website Analysis")
-                    st.markdown(f"**Technologies:** {', '.join(website_data['technologies'])}")
-                    st.markdown(f"**Services:** {', '.join(website_data['services'])}")
-                    st.markdown(f"**Target Industries:** {', '.join(website_data['target_industries'])}")
-                    st.markdown(f"**Case Studies:** {website_data['case_studies']}")
-                    
-                    # Recommendations
-                    st.markdown("#### Recommendations")
-                    if recommendations:
-                        for rec in recommendations:
-                            st.markdown(f"- {rec}")
-                    else:
-                        st.markdown("This company is an excellent match for the HubSpot Solution Partner Program!")
-                
-                # Export options
-                col1, col2 = st.columns(2)
-                with col1:
-                    if st.button("Export Analysis as PDF", key=f"pdf_{company_name}"):
-                        st.info("PDF export functionality would be implemented here in a production application")
-                
-                with col2:
-                    if st.button("Add to CRM", key=f"crm_{company_name}"):
-                        st.info("CRM integration would be implemented here in a production application")
+        if not hasattr(st.session_state, 'ranking'):
+            st.session_state.ranking = PartnerRanking(st.session_state.analysis)
+        
+        ranking = st.session_state.ranking
+        start, stop = render_pagination("analysis", len(ranking))
+        names = ranking.names(start, stop)
+        table_key = f"analysis_table_{st.session_state.get('analysis_version', 0)}_{st.session_state.analysis_page_size}_{start}"
+        selection = st.dataframe(build_analysis_frame(names, st.session_state.analysis, start), hide_index=True, width="stretch", on_select="rerun", selection_mode="single-row", key=table_key)
+        
+        company_name = names[selected_row(selection, len(names))]
+        render_analysis_detail(company_name, st.session_state.analysis[company_name], crm_token)
+        
+        render_export_panel(ranking, st.session_state.analysis, crm_token)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,398 @@
+# HubSpot Partner Finder - benchmark harness
+# Measures startup, scoring, recommendations, ranking, search, entity resolution, rendering
+# and website enrichment on synthetic data shaped like the mock records in app.py, and writes the results to JSON
+# so runs can be compared across versions, e.g.:
+#   python benchmark.py --sizes 10,1000,100000 -o before.json
+#   python benchmark.py --sizes 10,1000,100000 -o after.json --compare before.json
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+from streamlit import logger as streamlit_logger
+
+import app
+
+# Vocabulary for the synthetic records, taken from the crawler's keyword tables
+TECHNOLOGIES = list(app.TECHNOLOGY_KEYWORDS)
+SERVICES = list(app.SERVICE_KEYWORDS)
+INDUSTRIES = list(app.INDUSTRY_KEYWORDS)
+SPECIALIZATIONS = ["Digital Marketing", "CRM Implementation", "Content Marketing", "RevOps", "Marketing Automation", "Systems Integration", "Custom Development"]
+COMPANY_INDUSTRIES = ["Digital Marketing", "Business Consulting", "Technology Consulting", "Software Development", "Marketing Agency"]
+LOCATIONS = ["Boston, MA", "Austin, TX", "Chicago, IL", "New York, NY", "San Francisco, CA", "London, UK", "Berlin, DE"]
+TITLES = ["CEO", "CTO", "COO", "Chief Revenue Officer", "VP of Client Services", "VP of Professional Services", "Head of Marketing"]
+WORDS = ["agency", "consultancy", "partners", "solutions", "digital", "growth", "revenue", "marketing", "crm", "cloud", "data", "enterprise"]
+
+DEFAULT_SIZES = "10,100,1000,10000"
+SEARCH_QUERIES = ["digital marketing agency", "crm implementation", "revops consulting", "enterprise cloud data"]
+
+# Pages parsed by the fingerprinting benchmark; enough for a stable timing at any size
+FINGERPRINT_PAGES = 200
+
+# Slowest top-level imports of app.py reported by the cold start benchmark
+IMPORT_REPORT_MODULES = 10
+
+# Function to generate n companies shaped like search_companies results
+def synthetic_companies(n, seed=0):
+    rng = random.Random(seed)
+    companies = []
+    for i in range(n):
+        companies.append({
+            "name": f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} {i}",
+            "website": f"company{i}.example",
+            "employees": rng.randint(5, 2000),
+            "location": rng.choice(LOCATIONS),
+            "industry": rng.choice(COMPANY_INDUSTRIES),
+            "description": " ".join(rng.choice(WORDS) for _ in range(12)),
+            "founded": rng.randint(1990, 2023),
+            "specializations": rng.sample(SPECIALIZATIONS, rng.randint(1, 3))
+        })
+    return companies
+
+# Function to generate website_data for a company, shaped like scrape_company_website results
+def synthetic_website(company, rng):
+    return {
+        "technologies": rng.sample(TECHNOLOGIES, rng.randint(0, 5)),
+        "services": rng.sample(SERVICES, rng.randint(0, 6)),
+        "target_industries": rng.sample(INDUSTRIES, rng.randint(0, 4)),
+        "case_studies": rng.randint(0, 20),
+        "team_size_mentioned": f"{company['employees']}+ professionals" if rng.random() < 0.5 else "",
+        "enterprise_focus": rng.random() < 0.5
+    }
+
+# Function to generate linkedin_data for a company, shaped like get_linkedin_data results
+def synthetic_linkedin(company, rng):
+    return {
+        "follower_count": rng.randint(100, 20000),
+        "employee_count": company["employees"] + rng.randint(-5, 5),
+        "year_founded": company["founded"],
+        "headquarters": company["location"],
+        "specialties": rng.sample(SPECIALIZATIONS, rng.randint(0, 3)),
+        "recent_posts": rng.randint(0, 30),
+        "enterprise_clients": [f"Client {rng.randint(1, 999)}" for _ in range(rng.randint(0, 4))],
+        "key_executives": [{"name": f"Person {rng.randint(1, 9999)}", "title": title} for title in rng.sample(TITLES, rng.randint(1, 4))]
+    }
+
+# Function to generate n (company, website_data, linkedin_data) records
+def synthetic_records(n, seed=0):
+    rng = random.Random(seed + 1)
+    return [(company, synthetic_website(company, rng), synthetic_linkedin(company, rng)) for company in synthetic_companies(n, seed)]
+
+# Function to turn records into scored analysis entries, as stored in session state
+def synthetic_analyses(records):
+    scores = app.score_frame_to_dicts(app.score_companies(records))
+    return {
+        company["name"]: {"company": company, "website_data": website_data, "linkedin_data": linkedin_data, "score_data": score_data, "recommendations": []}
+        for (company, website_data, linkedin_data), score_data in zip(records, scores)
+    }
+
+# Function to render a synthetic site page full of the keywords the crawler looks for
+def synthetic_page(site, path, rng):
+    technologies = rng.sample(TECHNOLOGIES, rng.randint(0, 4))
+    services = rng.sample(SERVICES, rng.randint(1, 5))
+    industries = rng.sample(INDUSTRIES, rng.randint(0, 3))
+    scripts = "".join(f'<script src="https://cdn.example/{app.TECHNOLOGY_KEYWORDS[t][0]}.js"></script>' for t in technologies)
+    links = "".join(f'<a href="/site/{site}/{hint}">{hint}</a>' for hint in ("services", "case-studies/acme", "case-studies/globex", "about"))
+    text = " ".join(app.SERVICE_KEYWORDS[s][0] for s in services) + " for " + " and ".join(app.INDUSTRY_KEYWORDS[i][0] for i in industries)
+    filler = " ".join(rng.choice(WORDS) for _ in range(400))
+    return f"<html><head><title>Site {site}{path}</title>{scripts}</head><body><h1>Enterprise {text}</h1><p>{filler}</p>{links}</body></html>"
+
+# Local fake web: every port is a separate host, so the crawler's per-host politeness applies as it would in production
+class FakeWeb:
+    def __init__(self, hosts=16):
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                parts = self.path.strip("/").split("/")
+                if len(parts) < 2 or parts[0] != "site":
+                    self.send_error(404)
+                    return
+                etag = f'"{self.path}"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body = synthetic_page(parts[1], self.path, random.Random(self.path)).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.servers = [ThreadingHTTPServer(("127.0.0.1", 0), Handler) for _ in range(hosts)]
+        for server in self.servers:
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def url(self, site):
+        server = self.servers[site % len(self.servers)]
+        return f"http://127.0.0.1:{server.server_port}/site/{site}/"
+
+    def close(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+# Function to time fn over several runs (best of repeat), then measure its peak memory in one more run
+def measure(fn, repeat=1, memory=True):
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+
+    peak = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return min(timings), peak
+
+# Function to time `import app` in a fresh interpreter (best of repeat), returning the
+# seconds and app.py's slowest direct imports from -X importtime, in microseconds
+def measure_cold_import(repeat=3):
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import app"],
+            capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+        runs.append((time.perf_counter() - started, completed.stderr))
+    seconds, log = min(runs)
+
+    # Lines read "import time: self | cumulative | name", nested two spaces per
+    # level, with a module's imports listed before it
+    imports = {}
+    children = {}
+    for line in log.splitlines():
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        depth = (len(parts[2]) - len(parts[2].lstrip()) - 1) // 2
+        if depth == 1:
+            children[parts[2].strip()] = int(parts[1])
+        elif depth == 0:
+            if parts[2].strip() == "app":
+                imports = children
+            children = {}
+    slowest = sorted(imports.items(), key=lambda item: item[1], reverse=True)[:IMPORT_REPORT_MODULES]
+    return seconds, dict(slowest)
+
+# Function to build the startup benchmarks as (name, items, fn): what a Streamlit
+# rerun costs before main(), i.e. executing app.py's precompiled module body again
+def build_startup_cases():
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+    with open(path, encoding="utf-8") as f:
+        code = compile(f.read(), path, "exec")
+
+    def rerun():
+        exec(code, {"__name__": "app_rerun", "__file__": path})
+
+    return [("rerun_module_body", 1, rerun)]
+
+# Function to build every benchmark for one input size as (name, items, fn)
+def build_cases(size, args, fake_web=None):
+    records = synthetic_records(size, args.seed)
+    companies = [record[0] for record in records]
+    analyses = synthetic_analyses(records)
+    scored = [(record, analyses[record[0]["name"]]["score_data"]) for record in records]
+    features = app.build_feature_frame(records)
+    scores = app.score_feature_frame(features)
+    ranking = app.PartnerRanking(analyses)
+    names = ranking.names(0, app.PAGE_SIZE_OPTIONS[0])
+
+    def score_scalar():
+        for record in records:
+            app.score_company(*record)
+
+    def recommend_scalar():
+        for (company, website_data, linkedin_data), score_data in scored:
+            app.generate_recommendations(company, score_data, website_data, linkedin_data)
+
+    def rank_sorted():
+        sorted(analyses.items(), key=lambda item: item[1]["score_data"]["overall_match"], reverse=True)
+
+    def rank_top_k():
+        top = app.TopKRanking(app.TOP_K_DEFAULT)
+        for name, analysis in analyses.items():
+            top.offer(name, analysis["score_data"]["overall_match"], analysis)
+        top.analyses()
+
+    def search():
+        index = app.CompanyIndex(pd.DataFrame(companies, columns=app.COMPANY_COLUMNS))
+        for query in SEARCH_QUERIES:
+            index.search(query, min_employees=51)
+
+    # Every fourth company is listed again under a variant name and www. domain
+    listings = companies + [dict(company, name=f"{company['name']}, Inc.", website=f"www.{company['website']}") for company in companies[::4]]
+
+    # Pages are parsed once up front, so only signature matching is timed
+    rng = random.Random(args.seed)
+    parsers = []
+    for site in range(min(size, FINGERPRINT_PAGES)):
+        parser = app.PageParser(f"http://company{site}.example/")
+        parser.feed(synthetic_page(site, "/", rng))
+        parser.close()
+        parsers.append((parser, f"company{site}.example"))
+
+    def fingerprint():
+        for parser, host in parsers:
+            app._summarize_page(parser, host, "server: nginx")
+
+    cases = [
+        ("score_company", size, score_scalar),
+        ("score_companies_batch", size, lambda: app.score_companies(records)),
+        ("score_feature_frame", size, lambda: app.score_feature_frame(features)),
+        ("generate_recommendations", size, recommend_scalar),
+        ("recommend_feature_frame", size, lambda: app.recommend_feature_frame(features, scores)),
+        ("rank_sorted", size, rank_sorted),
+        ("rank_partner_ranking", size, lambda: app.PartnerRanking(analyses)),
+        ("rank_top_k", size, rank_top_k),
+        ("search_build_and_query", size, search),
+        ("resolve_companies", len(listings), lambda: app.resolve_companies(listings)),
+        ("fingerprint_pages", len(parsers), fingerprint),
+        ("render_companies_frame", size, lambda: app.build_companies_frame(companies)),
+        ("render_analysis_page", len(names), lambda: app.build_analysis_frame(names, analyses))
+    ]
+
+    if fake_web is not None and size <= args.enrich_max:
+        urls = [fake_web.url(i) for i in range(size)]
+
+        def crawl(crawler):
+            with ThreadPoolExecutor(max_workers=args.workers) as executor:
+                results = list(executor.map(crawler.crawl, urls))
+            if any(result is None for result in results):
+                raise RuntimeError("fake web crawl failed")
+
+        cold = app.WebsiteCrawler(delay=0)
+        cached = app.WebsiteCrawler(cache=app.EnrichmentCache(":memory:"), delay=0)
+        crawl(cached)
+        cases += [
+            ("enrich_crawl", size, lambda: crawl(cold)),
+            ("enrich_revalidate", size, lambda: crawl(cached))
+        ]
+    return cases
+
+# Function to run every benchmark at every size
+def run(args):
+    sizes = [int(size) for size in args.sizes.split(",")]
+    only = set(args.only.split(",")) if args.only else None
+    fake_web = None if args.no_enrich else FakeWeb(args.hosts)
+    results = []
+
+    # Startup doesn't depend on the input size, so it is measured once
+    if not only or "cold_import" in only:
+        seconds, imports = measure_cold_import(args.repeat)
+        results.append({"benchmark": "cold_import", "size": 1, "items": 1, "seconds": seconds, "slowest_imports_us": imports})
+        print(f"{'cold_import':26} {1:>8} {seconds:10.4f}s  " + ", ".join(f"{name} {us / 1000:.0f}ms" for name, us in imports.items()), file=sys.stderr)
+    for name, items, fn in build_startup_cases():
+        if only and name not in only:
+            continue
+        seconds, peak = measure(fn, args.repeat, memory=not args.no_memory)
+        results.append({"benchmark": name, "size": 1, "items": items, "seconds": seconds, "peak_memory_bytes": peak})
+        print(f"{name:26} {1:>8} {seconds:10.4f}s", file=sys.stderr)
+
+    try:
+        for size in sizes:
+            for name, items, fn in build_cases(size, args, fake_web):
+                if only and name not in only:
+                    continue
+                seconds, peak = measure(fn, args.repeat, memory=not args.no_memory)
+                result = {
+                    "benchmark": name,
+                    "size": size,
+                    "items": items,
+                    "seconds": seconds,
+                    "items_per_second": items / seconds if seconds else None,
+                    "microseconds_per_item": seconds / items * 1e6 if items else None,
+                    "peak_memory_bytes": peak
+                }
+                results.append(result)
+                memory = f"{peak / 1e6:9.1f} MB" if peak is not None else ""
+                print(f"{name:26} {size:>8} {seconds:10.4f}s {result['microseconds_per_item'] or 0:12.2f} us/item {memory}", file=sys.stderr)
+    finally:
+        if fake_web is not None:
+            fake_web.close()
+    return results
+
+# Function to describe the code and machine a run was made on
+def run_metadata():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "rules_version": app.get_ipp_rules().version,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.time()
+    }
+
+# Function to print how each benchmark moved against an earlier run
+def compare(results, baseline_path):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["benchmark"], r["size"]): r for r in json.load(f)["results"]}
+    print(f"{'benchmark':26} {'size':>8} {'before':>10} {'after':>10} {'speedup':>8}", file=sys.stderr)
+    for result in results:
+        before = baseline.get((result["benchmark"], result["size"]))
+        if before and result["seconds"]:
+            print(f"{result['benchmark']:26} {result['size']:>8} {before['seconds']:10.4f} {result['seconds']:10.4f} {before['seconds'] / result['seconds']:7.2f}x", file=sys.stderr)
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="HubSpot Partner Finder benchmarks")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"comma-separated input sizes, 10 to 1000000 (default: {DEFAULT_SIZES})")
+    parser.add_argument("--only", help="comma-separated benchmark names to run")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per benchmark; the best is reported")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc run used for peak memory")
+    parser.add_argument("--no-enrich", action="store_true", help="skip the crawl benchmarks against the local fake web")
+    parser.add_argument("--enrich-max", type=int, default=1000, help="largest size crawled against the fake web")
+    parser.add_argument("--hosts", type=int, default=16, help="fake web hosts (ports) the sites are spread over")
+    parser.add_argument("--workers", type=int, default=app.DEFAULT_MAX_WORKERS, help="concurrent crawls")
+    parser.add_argument("--output", "-o", default="-", help="JSON results path (default: stdout)")
+    parser.add_argument("--compare", help="earlier JSON results to compare against")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    # Streamlit warns about the missing script context on every cached call in bare mode
+    streamlit_logger.set_log_level("error")
+
+    report = {"metadata": run_metadata(), "results": run(args)}
+    if args.compare:
+        compare(report["results"], args.compare)
+
+    if args.output == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
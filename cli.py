@@ -0,0 +1,373 @@
+# HubSpot Partner Finder - headless entry point
+# Runs search -> enrich -> score -> export without the Streamlit UI, e.g. for nightly batch jobs
+
+import argparse
+import contextlib
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from streamlit import logger as streamlit_logger
+
+import app
+
+# Function to read companies from a CSV or JSONL file, one record at a time
+def read_companies(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith((".jsonl", ".ndjson")):
+            for line in f:
+                if line.strip():
+                    yield _normalize_company(json.loads(line))
+        else:
+            for row in csv.DictReader(f):
+                yield _normalize_company(row)
+
+# Function to coerce a raw input record into the shape search_companies returns
+def _normalize_company(record):
+    specializations = record.get("specializations") or []
+    if isinstance(specializations, str):
+        specializations = [s.strip() for s in specializations.split(";") if s.strip()]
+
+    return {
+        "name": record["name"],
+        "website": record.get("website") or "",
+        "employees": int(record.get("employees") or 0),
+        "location": record.get("location") or "",
+        "industry": record.get("industry") or "",
+        "description": record.get("description") or "",
+        "founded": int(record["founded"]) if record.get("founded") else None,
+        "specializations": specializations
+    }
+
+# Function to report progress on stderr at most once per interval
+def _progress_reporter(interval=2.0):
+    started = time.monotonic()
+    state = {"last": 0.0}
+
+    def report(done, failed, final=False):
+        now = time.monotonic()
+        if not final and now - state["last"] < interval:
+            return
+        state["last"] = now
+        elapsed = now - started
+        rate = done / elapsed if elapsed else 0.0
+        print(f"analyzed {done} companies ({failed} provisional after failed lookups) in {elapsed:.1f}s, {rate:.1f}/s", file=sys.stderr)
+
+    return report
+
+# Function to run the full pipeline and export the scored results
+def run_analyze(args):
+    if args.format == "parquet" and args.output == "-":
+        print("--format parquet needs an --output path", file=sys.stderr)
+        return 2
+
+    if args.input:
+        companies = read_companies(args.input)
+    else:
+        companies = app.search_companies(
+            args.query,
+            args.location,
+            args.industry,
+            os.getenv("CLEARBIT_API_KEY"),
+            min_employees=args.min_employees,
+            max_employees=args.max_employees,
+            limit=args.limit
+        )
+
+    # Duplicates are dropped as they stream in, before any lookup is made
+    resolver = app.EntityResolver()
+    if not args.no_dedupe:
+        companies = app.iter_unique_companies(companies, resolver)
+
+    if args.top_k:
+        ranked, stats = app.top_partners(
+            companies,
+            args.top_k,
+            os.getenv("LINKEDIN_USERNAME"),
+            os.getenv("LINKEDIN_PASSWORD"),
+            max_workers=args.workers
+        )
+        print(f"enriched {stats['enriched']} of {stats['candidates']} companies, {stats['pruned']} pruned, {stats['failed']} failed, {resolver.duplicates} duplicates skipped", file=sys.stderr)
+        if args.output == "-":
+            app.write_jsonl(ranked.values(), sys.stdout, args.chunk_size)
+        else:
+            app.export_analyses(ranked.values(), args.output, args.format, args.chunk_size)
+        return 0
+
+    results = app.iter_analyze_companies(
+        companies,
+        os.getenv("LINKEDIN_USERNAME"),
+        os.getenv("LINKEDIN_PASSWORD"),
+        max_workers=args.workers,
+        fit_threshold=args.fit_threshold
+    )
+
+    report = _progress_reporter()
+    counts = {"done": 0, "failed": 0}
+
+    # Results are exported as they stream out of the pipeline
+    def analyses():
+        for company, analysis in results:
+            counts["done"] += 1
+            if analysis["missing_sources"]:
+                counts["failed"] += 1
+            yield analysis
+            report(counts["done"], counts["failed"])
+
+    if args.output == "-":
+        app.write_jsonl(analyses(), sys.stdout, args.chunk_size)
+    else:
+        app.export_analyses(analyses(), args.output, args.format, args.chunk_size)
+
+    report(counts["done"], counts["failed"], final=True)
+    if resolver.duplicates:
+        print(f"skipped {resolver.duplicates} duplicate companies", file=sys.stderr)
+    return 0 if counts["done"] > counts["failed"] or counts["done"] == 0 else 1
+
+# Function to collapse duplicate companies in a file, merging each group into one record
+def run_dedupe(args):
+    companies, aliases = app.resolve_companies(read_companies(args.input))
+    with open(args.output, "w", encoding="utf-8") if args.output != "-" else contextlib.nullcontext(sys.stdout) as out:
+        for company in companies:
+            out.write(json.dumps(company) + "\n")
+    if args.aliases:
+        with open(args.aliases, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["name", "merged_into"])
+            writer.writerows(aliases.items())
+    print(f"{len(companies)} companies after merging {len(aliases)} duplicates", file=sys.stderr)
+    return 0
+
+# Function to read analyses back from a JSONL export
+def read_analyses(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+# Function to push an exported JSONL file of analyses to the CRM
+def run_crm_push(args):
+    token = os.getenv("HUBSPOT_ACCESS_TOKEN")
+    if not token:
+        print("HUBSPOT_ACCESS_TOKEN is not set", file=sys.stderr)
+        return 2
+
+    client = app.CrmClient(token, args.base_url, cache=app.get_enrichment_cache(), batch_size=args.batch_size)
+    result = client.upsert_partners(read_analyses(args.input))
+    print(json.dumps(result, indent=2))
+    return 1 if result["failed"] else 0
+
+# Function to build the shared, memory-mapped enrichment store from a JSONL export
+def run_build_store(args):
+    records = ((record["company"], record["website_data"], record["linkedin_data"]) for record in read_analyses(args.input))
+    rows = app.write_enrichment_store(records, args.output)
+    print(f"stored {rows} companies in {args.output} (set ENRICHMENT_STORE_PATH to use it)", file=sys.stderr)
+    return 0
+
+# Entry point of a spawned worker process, which starts without main()'s logging setup
+def _worker_process(queue_path, workers, exit_when_idle, verbose):
+    configure_logging(verbose)
+    app.run_worker(queue_path, workers, exit_when_idle=exit_when_idle)
+
+# Function to run background workers that drain the job queue
+def run_worker(args):
+    if args.processes <= 1:
+        processed = app.run_worker(args.queue, args.workers, exit_when_idle=args.exit_when_idle)
+        print(f"worker {os.getpid()} analyzed {processed} companies", file=sys.stderr)
+        return 0
+
+    # Worker processes share nothing but the queue file; leases keep them off each other's items
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=_worker_process, args=(args.queue, args.workers, args.exit_when_idle, args.verbose), daemon=True)
+        for _ in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    print(f"started {len(processes)} workers on {args.queue}", file=sys.stderr)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+    return 0 if all(process.exitcode == 0 for process in processes) else 1
+
+# Function to queue companies for the background workers
+def run_submit(args):
+    queue = app.JobQueue(args.queue)
+    run_id = queue.submit(read_companies(args.input), {"fit_threshold": args.fit_threshold}, args.item_size)
+    progress = queue.progress(run_id)
+    print(f"queued run {run_id} with {progress['total']} companies", file=sys.stderr)
+    print(run_id)
+    return 0
+
+# Function to report a run's progress, optionally exporting its results
+def run_status(args):
+    queue = app.JobQueue(args.queue)
+    progress = queue.progress(args.run_id)
+    if progress is None:
+        print(f"unknown run {args.run_id}", file=sys.stderr)
+        return 2
+    print(json.dumps(progress, indent=2), file=sys.stderr)
+    if args.output:
+        results, _ = queue.results(args.run_id)
+        app.export_analyses(results.values(), args.output, args.format, args.chunk_size)
+    return 0 if progress["finished"] else 1
+
+# Local stand-in for the HubSpot batch upsert endpoint, for trying out CRM pushes
+def run_mock_crm(args):
+    records = {}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *log_args):
+            if args.verbose:
+                super().log_message(format, *log_args)
+
+        def do_POST(self):
+            if self.path != app.CRM_UPSERT_PATH:
+                self.send_error(404)
+                return
+            if random.random() < args.throttle_rate:
+                self.send_response(429)
+                self.send_header("Retry-After", "1")
+                self.end_headers()
+                return
+
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            results = []
+            errors = []
+            with lock:
+                for item in body["inputs"]:
+                    # Rejected inputs are reported the way HubSpot does, in a 207 Multi-Status
+                    if random.random() < args.error_rate:
+                        errors.append({"status": "error", "category": "VALIDATION_ERROR", "message": "Property values were not valid", "context": {"ids": [item["id"]]}})
+                        continue
+                    records[item["id"]] = item["properties"]
+                    results.append({"id": str(abs(hash(item["id"]))), "properties": item["properties"]})
+                total = len(records)
+            print(f"upserted {len(results)} companies, rejected {len(errors)} ({total} stored)", file=sys.stderr)
+
+            response = {"status": "COMPLETE", "results": results}
+            if errors:
+                response.update(errors=errors, numErrors=len(errors))
+            payload = json.dumps(response).encode("utf-8")
+            self.send_response(207 if errors else 200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), Handler)
+    print(f"mock CRM listening on http://127.0.0.1:{server.server_port} (set CRM_API_BASE to use it)", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="HubSpot Partner Finder batch pipeline")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log every lookup")
+    parser.add_argument("--metrics-out", help="write per-stage timings, call counts and cache stats to this JSON file")
+    parser.add_argument("--profile", action="store_true", help="print a cProfile/tracemalloc report of the pipeline on stderr")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    analyze = subparsers.add_parser("analyze", help="enrich and score companies, exporting JSONL or Parquet")
+    source = analyze.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", help="CSV or JSONL file of companies (CSV specializations separated by ';')")
+    source.add_argument("--query", help="search for companies instead of reading a file")
+    analyze.add_argument("--location", help="location filter for --query")
+    analyze.add_argument("--industry", help="industry filter for --query")
+    analyze.add_argument("--min-employees", type=int, help="minimum company size for --query")
+    analyze.add_argument("--max-employees", type=int, help="maximum company size for --query")
+    analyze.add_argument("--limit", type=int, default=app.SEARCH_RESULT_LIMIT, help="maximum companies returned by --query")
+    analyze.add_argument("--output", "-o", default="-", help="output path (default: JSONL on stdout)")
+    analyze.add_argument("--format", choices=app.EXPORT_FORMATS, default="jsonl", help="output format")
+    analyze.add_argument("--chunk-size", type=int, default=app.EXPORT_CHUNK_SIZE, help="records per write / Parquet row group")
+    analyze.add_argument("--top-k", type=int, default=0, help="only enrich and export the K best partners, best first")
+    analyze.add_argument("--fit-threshold", type=float, default=app.ENRICHMENT_FIT_THRESHOLD, help="skip LinkedIn for companies whose best possible match (%%) is below this")
+    analyze.add_argument("--workers", type=int, default=app.DEFAULT_MAX_WORKERS, help="concurrent website/LinkedIn lookups")
+    analyze.add_argument("--no-dedupe", action="store_true", help="enrich every record, even ones resolving to a company already seen")
+    analyze.set_defaults(handler=run_analyze)
+
+    dedupe = subparsers.add_parser("dedupe", help="collapse duplicate companies in a CSV or JSONL file into JSONL")
+    dedupe.add_argument("--input", required=True, help="CSV or JSONL file of companies (CSV specializations separated by ';')")
+    dedupe.add_argument("--output", "-o", default="-", help="output path (default: JSONL on stdout)")
+    dedupe.add_argument("--aliases", help="also write a CSV mapping each merged name to the name kept")
+    dedupe.set_defaults(handler=run_dedupe)
+
+    crm_push = subparsers.add_parser("crm-push", help="upsert an exported JSONL file into the CRM (token from HUBSPOT_ACCESS_TOKEN)")
+    crm_push.add_argument("--input", required=True, help="JSONL produced by analyze")
+    crm_push.add_argument("--base-url", default=app.CRM_API_BASE, help="CRM API base URL")
+    crm_push.add_argument("--batch-size", type=int, default=app.CRM_BATCH_SIZE, help="records per upsert request")
+    crm_push.set_defaults(handler=run_crm_push)
+
+    build_store = subparsers.add_parser("build-store", help="build the shared enrichment store from a JSONL file produced by analyze")
+    build_store.add_argument("--input", required=True, help="JSONL produced by analyze")
+    build_store.add_argument("--output", "-o", default=app.ENRICHMENT_STORE_PATH or "enrichment_store", help="store directory")
+    build_store.set_defaults(handler=run_build_store)
+
+    worker = subparsers.add_parser("worker", help="process queued analysis runs in background worker processes")
+    worker.add_argument("--queue", default=app.JOB_QUEUE_PATH, help="job queue database")
+    worker.add_argument("--processes", type=int, default=app.JOB_WORKER_PROCESSES, help="worker processes (default: one per core)")
+    worker.add_argument("--workers", type=int, default=app.DEFAULT_MAX_WORKERS, help="concurrent website/LinkedIn lookups per process")
+    worker.add_argument("--exit-when-idle", action="store_true", help="stop once the queue is empty instead of polling for more")
+    worker.set_defaults(handler=run_worker)
+
+    submit = subparsers.add_parser("submit", help="queue a CSV or JSONL file of companies for the workers; prints the run id")
+    submit.add_argument("--input", required=True, help="CSV or JSONL file of companies (CSV specializations separated by ';')")
+    submit.add_argument("--queue", default=app.JOB_QUEUE_PATH, help="job queue database")
+    submit.add_argument("--item-size", type=int, default=app.JOB_ITEM_SIZE, help="companies per work item")
+    submit.add_argument("--fit-threshold", type=float, default=app.ENRICHMENT_FIT_THRESHOLD, help="skip LinkedIn for companies whose best possible match (%%) is below this")
+    submit.set_defaults(handler=run_submit)
+
+    status = subparsers.add_parser("status", help="show a queued run's progress (exit 1 while it is still running)")
+    status.add_argument("run_id")
+    status.add_argument("--queue", default=app.JOB_QUEUE_PATH, help="job queue database")
+    status.add_argument("--output", "-o", help="export the run's analyses to this path")
+    status.add_argument("--format", choices=app.EXPORT_FORMATS, default="jsonl", help="output format")
+    status.add_argument("--chunk-size", type=int, default=app.EXPORT_CHUNK_SIZE, help="records per write / Parquet row group")
+    status.set_defaults(handler=run_status)
+
+    mock_crm = subparsers.add_parser("mock-crm", help="run a local stand-in for the CRM batch upsert API")
+    mock_crm.add_argument("--port", type=int, default=8765)
+    mock_crm.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+    mock_crm.add_argument("--error-rate", type=float, default=0.0, help="fraction of records rejected in a 207 Multi-Status response")
+    mock_crm.set_defaults(handler=run_mock_crm)
+
+    return parser
+
+# Function to set up logging for a headless run
+def configure_logging(verbose=False):
+    logging.basicConfig(
+        level=logging.INFO if verbose else logging.WARNING,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+    )
+    # Streamlit warns about the missing script context on every cached call in bare mode
+    streamlit_logger.set_log_level("error")
+    if not verbose:
+        logging.getLogger("urllib3").setLevel(logging.ERROR)
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    configure_logging(args.verbose)
+
+    with app.capture_profile() if args.profile else contextlib.nullcontext() as capture:
+        code = args.handler(args)
+    if capture:
+        print(capture.report, file=sys.stderr)
+    if args.metrics_out:
+        app.dump_metrics(args.metrics_out)
+    return code
+
+if __name__ == "__main__":
+    sys.exit(main())
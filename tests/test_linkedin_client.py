@@ -0,0 +1,133 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import app
+
+
+# Stand-in for linkedin_api.Linkedin that answers from memory and counts calls
+class FakeLinkedin:
+    def __init__(self, delay=None):
+        self.delay = delay
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def _record(self, method):
+        with self._lock:
+            self.calls.append(method)
+        if self.delay is not None:
+            self.delay.wait(5)
+
+    def search_companies(self, keywords, limit):
+        self._record("search_companies")
+        return [{"urn_id": f"urn-{keywords[0]}"}]
+
+    def get_company(self, urn_id):
+        self._record("get_company")
+        return {"followingInfo": {"followerCount": 100}, "staffCount": 12, "foundedOn": {"year": 2010}}
+
+    def search_people(self, current_company, keyword_title, limit):
+        self._record("search_people")
+        return [{"name": "Sam Lee", "jobtitle": "CEO"}]
+
+
+def make_manager(fake, **kwargs):
+    logins = []
+
+    def factory():
+        logins.append(1)
+        return fake
+
+    kwargs.setdefault("requests_per_minute", 60000)
+    return app.LinkedInClientManager("user", "secret", client_factory=factory, **kwargs), logins
+
+
+def test_concurrent_lookups_of_one_company_are_coalesced():
+    release = threading.Event()
+    fake = FakeLinkedin(delay=release)
+    manager, _ = make_manager(fake)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(manager.get_company, name) for name in ["Acme Inc", "acme inc", " Acme Inc", "Acme Inc"]]
+        # Hold the first lookup open until the other three have joined it
+        deadline = time.monotonic() + 5
+        while manager.stats["coalesced"] < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        release.set()
+        results = [future.result() for future in futures]
+
+    assert manager.stats["lookups"] == 1
+    assert manager.stats["coalesced"] == 3
+    assert fake.calls.count("search_companies") == 1
+    assert all(result == results[0] for result in results)
+
+
+def test_get_companies_deduplicates_names():
+    fake = FakeLinkedin()
+    manager, _ = make_manager(fake)
+
+    found = manager.get_companies(["Acme Inc", "Globex", "acme inc"])
+
+    assert set(found) == {"Acme Inc", "Globex", "acme inc"}
+    assert found["Acme Inc"] == found["acme inc"]
+    assert manager.stats["lookups"] == 2
+
+
+def test_budget_exhaustion_raises():
+    fake = FakeLinkedin()
+    # One lookup takes three requests, so a budget of four covers one company
+    manager, _ = make_manager(fake, budget=4)
+
+    manager.get_company("Acme Inc")
+    with pytest.raises(app.LinkedInBudgetExceeded):
+        manager.get_company("Globex")
+    assert manager.stats["requests"] == 4
+
+
+def test_failed_lookups_come_back_as_none_in_a_batch():
+    fake = FakeLinkedin()
+    manager, _ = make_manager(fake, budget=3)
+
+    found = manager.get_companies(["Acme Inc", "Globex"], max_workers=1)
+
+    assert found["Acme Inc"] is not None
+    assert found["Globex"] is None
+
+
+def test_logs_in_once_across_many_calls():
+    fake = FakeLinkedin()
+    manager, logins = make_manager(fake)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(manager.get_company, [f"Company {i}" for i in range(20)]))
+
+    assert len(logins) == 1
+    assert manager.stats["logins"] == 1
+    assert manager.stats["lookups"] == 20
+
+
+def test_failed_names_are_reported_apart_from_not_found():
+    fake = FakeLinkedin()
+    fake.search_companies = lambda keywords, limit: []
+    manager, _ = make_manager(fake, budget=1)
+    failed = set()
+
+    found = manager.get_companies(["Acme Inc", "Globex", "globex"], max_workers=1, failed=failed)
+
+    assert found == {"Acme Inc": None, "Globex": None, "globex": None}
+    assert failed == {"Globex", "globex"}
+
+
+def test_fetched_bytes_are_recorded_under_the_callers_stage(monkeypatch):
+    metrics = app.PipelineMetrics()
+    monkeypatch.setattr(app, "_pipeline_metrics", metrics)
+    manager, _ = make_manager(FakeLinkedin())
+
+    manager.get_company("Acme Inc")
+    manager.get_companies(["Globex"], stage="get_linkedin_data_batch")
+
+    stages = metrics.snapshot()["stages"]
+    assert stages["get_linkedin_data"]["bytes"] > 0
+    assert stages["get_linkedin_data_batch"]["bytes"] > 0